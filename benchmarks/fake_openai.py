@@ -0,0 +1,118 @@
+"""Stand-in for the OpenAI Responses API with configurable latency.
+
+Serves POST /v1/responses in both the plain and the streaming (SSE) form used
+by src/ai_generator.py. Questions are random word salad, so they are distinct
+enough to pass the near-duplicate index.
+
+    FAKE_OPENAI_LATENCY_MS=800 FAKE_OPENAI_JITTER_MS=200 \
+        uvicorn benchmarks.fake_openai:app --port 8100
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_MS = float(os.getenv('FAKE_OPENAI_LATENCY_MS', '500'))
+JITTER_MS = float(os.getenv('FAKE_OPENAI_JITTER_MS', '100'))
+STREAM_CHUNKS = int(os.getenv('FAKE_OPENAI_STREAM_CHUNKS', '20'))
+
+WORDS = (
+    'list dict tuple set generator decorator closure coroutine iterator context manager '
+    'descriptor metaclass slots property lambda comprehension exception traceback module '
+    'package import asyncio thread process lock queue socket index query join cache '
+    'transaction isolation pool session cursor schema migration endpoint middleware '
+    'serializer pagination token header cookie retry timeout backoff latency throughput'
+).split()
+
+app = FastAPI()
+
+
+def _sentence(words: int) -> str:
+    return ' '.join(random.choice(WORDS) for _ in range(words))
+
+
+def _question() -> dict:
+    return {
+        'title': f"What happens to the {_sentence(8)}?",
+        'options': {key: _sentence(5) for key in 'ABCD'},
+        'correct_answer_id': random.randint(0, 3),
+        'explanation': _sentence(25),
+    }
+
+
+def _requested_count(body: dict) -> int:
+    match = re.search(r'Generate (\d+)', str(body.get('input', '')))
+    return int(match.group(1)) if match else 1
+
+
+def _response(text: str) -> dict:
+    output_tokens = len(text) // 4
+    return {
+        'id': f"resp_{uuid.uuid4().hex}",
+        'object': 'response',
+        'created_at': int(time.time()),
+        'model': 'gpt-4.1-nano',
+        'status': 'completed',
+        'output': [{
+            'type': 'message',
+            'id': f"msg_{uuid.uuid4().hex}",
+            'status': 'completed',
+            'role': 'assistant',
+            'content': [{'type': 'output_text', 'text': text, 'annotations': []}],
+        }],
+        'parallel_tool_calls': True,
+        'tool_choice': 'auto',
+        'tools': [],
+        'usage': {
+            'input_tokens': 350,
+            'input_tokens_details': {'cached_tokens': 0},
+            'output_tokens': output_tokens,
+            'output_tokens_details': {'reasoning_tokens': 0},
+            'total_tokens': 350 + output_tokens,
+        },
+    }
+
+
+async def _sleep_latency(fraction: float = 1.0):
+    delay = max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)) * fraction
+    await asyncio.sleep(delay / 1000)
+
+
+def _sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+@app.post('/v1/responses')
+async def responses(request: Request):
+    body = await request.json()
+    text = json.dumps({'questions': [_question() for _ in range(_requested_count(body))]})
+
+    if not body.get('stream'):
+        await _sleep_latency()
+        return JSONResponse(_response(text))
+
+    async def events():
+        sequence = 0
+        await _sleep_latency(0.3)
+        chunk_size = max(1, len(text) // STREAM_CHUNKS)
+        for start in range(0, len(text), chunk_size):
+            await _sleep_latency(0.7 / STREAM_CHUNKS)
+            sequence += 1
+            yield _sse({
+                'type': 'response.output_text.delta',
+                'item_id': 'msg_fake',
+                'output_index': 0,
+                'content_index': 0,
+                'delta': text[start:start + chunk_size],
+                'logprobs': [],
+                'sequence_number': sequence,
+            })
+        yield _sse({'type': 'response.completed', 'response': _response(text), 'sequence_number': sequence + 1})
+
+    return StreamingResponse(events(), media_type='text/event-stream')
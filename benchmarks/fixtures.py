@@ -0,0 +1,55 @@
+"""Local PostgreSQL fixture: recreates the schema and seeds benchmark users."""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+
+from src.database.models import Base, Challenge, ChallengeQuota
+
+HISTORY_SIZES = (10, 100, 1000, 10000)
+GENERATE_USERS = 200
+UNLIMITED_QUOTA = 1_000_000_000
+
+
+def history_user(size: int) -> str:
+    return f"bench_history_{size}"
+
+
+def generate_user(index: int) -> str:
+    return f"bench_generate_{index}"
+
+
+def _challenge_rows(user_id: str, count: int):
+    now = datetime.now()
+    for index in range(count):
+        yield {
+            'difficulty': random.choice(('easy', 'medium', 'hard')),
+            'date_created': now - timedelta(minutes=count - index),
+            'created_by': user_id,
+            'title': f"Benchmark challenge {index} for {user_id}",
+            'options': {'A': 'first', 'B': 'second', 'C': 'third', 'D': 'fourth'},
+            'correct_answer_id': index % 4,
+            'explanation': 'Seeded by the benchmark fixture.',
+        }
+
+
+def reset_database(database_url: str):
+    """Drop and recreate every table, then seed history and generation users."""
+    engine = create_engine(database_url)
+    try:
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            for size in HISTORY_SIZES:
+                rows = list(_challenge_rows(history_user(size), size))
+                for start in range(0, len(rows), 1000):
+                    connection.execute(insert(Challenge), rows[start:start + 1000])
+
+            users = [history_user(size) for size in HISTORY_SIZES]
+            users += [generate_user(index) for index in range(GENERATE_USERS)]
+            connection.execute(insert(ChallengeQuota), [
+                {'user_id': user_id, 'quota_remaining': UNLIMITED_QUOTA, 'last_reset_date': datetime.now()}
+                for user_id in users
+            ])
+    finally:
+        engine.dispose()
@@ -0,0 +1,50 @@
+"""Local credentials for benchmarks: a Clerk-style RS256 session token signer and svix webhook signing."""
+import base64
+import os
+import time
+from datetime import datetime, timezone
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from svix.webhooks import Webhook
+
+
+class SessionTokenSigner:
+    """Signs session tokens that validate against the matching CLERK_JWT_KEY."""
+
+    def __init__(self, authorized_party: str = 'http://localhost'):
+        self.authorized_party = authorized_party
+        self._private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    @property
+    def public_key_pem(self) -> str:
+        return self._private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+
+    def sign(self, user_id: str, ttl_seconds: int = 3600) -> str:
+        now = int(time.time())
+        return jwt.encode(
+            {'sub': user_id, 'iat': now, 'nbf': now, 'exp': now + ttl_seconds, 'azp': self.authorized_party},
+            self._private_key,
+            algorithm='RS256'
+        )
+
+
+class WebhookSigner:
+    """Produces svix headers for payloads sent to /webhooks/clerk."""
+
+    def __init__(self):
+        self.secret = 'whsec_' + base64.b64encode(os.urandom(24)).decode()
+        self._webhook = Webhook(self.secret)
+
+    def headers(self, message_id: str, payload: str) -> dict:
+        timestamp = datetime.now(tz=timezone.utc)
+        return {
+            'svix-id': message_id,
+            'svix-timestamp': str(int(timestamp.timestamp())),
+            'svix-signature': self._webhook.sign(message_id, timestamp, payload),
+            'content-type': 'application/json',
+        }
@@ -0,0 +1,46 @@
+"""Export stored challenges as NDJSON or CSV.
+
+Rows are read through a server-side cursor and written as they arrive, so memory
+use stays flat regardless of how many challenges are exported.
+
+    python export.py --user-id user_123 --format csv --output history.csv
+    python export.py > all-challenges.ndjson
+"""
+import argparse
+import asyncio
+import sys
+
+from src.logger import setup_logger
+
+
+async def export(args) -> int:
+    from src.database.db import EXPORT_COLUMNS, stream_user_challenges
+    from src.database.session import dispose_engine, get_session_factory, init_engine
+    from src.services.export import export_rows
+
+    init_engine()
+    output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        async with get_session_factory()() as db:
+            result = await stream_user_challenges(db, args.user_id)
+            async for chunk in export_rows(result, args.format, [column.key for column in EXPORT_COLUMNS]):
+                output.write(chunk)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        await dispose_engine()
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user-id', help='Only export this user\'s challenges (default: every user)')
+    parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson')
+    parser.add_argument('--output', metavar='PATH', help='File to write (default: stdout)')
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    # stdout carries the export itself when no --output is given.
+    setup_logger(stream=sys.stderr)
+    sys.exit(asyncio.run(export(parse_args())))
@@ -0,0 +1,39 @@
+"""Add challenge pool
+
+Revision ID: b3c1d4e5f607
+Revises: 70919f902a7e
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3c1d4e5f607'
+down_revision: Union[str, Sequence[str], None] = '70919f902a7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('challenge_pool',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('difficulty', sa.String(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('options', sa.String(), nullable=False),
+    sa.Column('correct_answer_id', sa.Integer(), nullable=False),
+    sa.Column('explanation', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_challenge_pool_difficulty'), 'challenge_pool', ['difficulty'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_challenge_pool_difficulty'), table_name='challenge_pool')
+    op.drop_table('challenge_pool')
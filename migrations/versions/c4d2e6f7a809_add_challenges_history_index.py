@@ -0,0 +1,32 @@
+"""Add challenges history index
+
+Revision ID: c4d2e6f7a809
+Revises: b3c1d4e5f607
+Create Date: 2026-10-18 10:04:17.552961
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d2e6f7a809'
+down_revision: Union[str, Sequence[str], None] = 'b3c1d4e5f607'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_challenges_created_by_date_created_id',
+        'challenges',
+        ['created_by', 'date_created', 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_challenges_created_by_date_created_id', table_name='challenges')
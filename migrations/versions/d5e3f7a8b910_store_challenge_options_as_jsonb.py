@@ -0,0 +1,48 @@
+"""Store challenge options as JSONB
+
+Revision ID: d5e3f7a8b910
+Revises: c4d2e6f7a809
+Create Date: 2026-10-18 10:41:53.027714
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e3f7a8b910'
+down_revision: Union[str, Sequence[str], None] = 'c4d2e6f7a809'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('challenges', 'challenge_pool')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows hold json.dumps() output, so the cast converts them in place.
+    for table in TABLES:
+        op.alter_column(
+            table,
+            'options',
+            existing_type=sa.String(),
+            type_=postgresql.JSONB(astext_type=sa.Text()),
+            existing_nullable=False,
+            postgresql_using='options::jsonb'
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.alter_column(
+            table,
+            'options',
+            existing_type=postgresql.JSONB(astext_type=sa.Text()),
+            type_=sa.String(),
+            existing_nullable=False,
+            postgresql_using='options::text'
+        )
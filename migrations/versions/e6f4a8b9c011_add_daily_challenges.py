@@ -0,0 +1,48 @@
+"""Add daily challenges
+
+Revision ID: e6f4a8b9c011
+Revises: d5e3f7a8b910
+Create Date: 2026-10-18 11:58:07.604129
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f4a8b9c011'
+down_revision: Union[str, Sequence[str], None] = 'd5e3f7a8b910'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('daily_challenges',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('challenge_date', sa.Date(), nullable=False),
+    sa.Column('difficulty', sa.String(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('options', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('correct_answer_id', sa.Integer(), nullable=False),
+    sa.Column('explanation', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('challenge_date', 'difficulty', name='uq_daily_challenges_date_difficulty')
+    )
+    op.create_table('daily_challenge_assignments',
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('daily_challenge_id', sa.Integer(), nullable=False),
+    sa.Column('date_assigned', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['daily_challenge_id'], ['daily_challenges.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'daily_challenge_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('daily_challenge_assignments')
+    op.drop_table('daily_challenges')
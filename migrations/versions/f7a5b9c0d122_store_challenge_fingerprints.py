@@ -0,0 +1,73 @@
+"""Store challenge fingerprints
+
+Revision ID: f7a5b9c0d122
+Revises: e6f4a8b9c011
+Create Date: 2026-10-19 09:21:36.184502
+
+"""
+import hashlib
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a5b9c0d122'
+down_revision: Union[str, Sequence[str], None] = 'e6f4a8b9c011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('challenges', 'challenge_pool')
+BATCH_SIZE = 1000
+NON_WORD = re.compile(r'[^a-z0-9_]+')
+
+
+# Frozen copy of src.services.fingerprint.challenge_fingerprint as of this revision,
+# so later changes to the app's hashing don't alter what this migration writes.
+def challenge_fingerprint(challenge) -> int:
+    options = challenge['options']
+    text = ' '.join([challenge['title'], *(str(options[key]) for key in sorted(options))])
+    tokens = NON_WORD.sub(' ', text.lower()).split()
+    features = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+
+    weights = [0] * 64
+    for feature in features:
+        digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            weights[bit] += 1 if digest >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def to_bigint(fingerprint: int) -> int:
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    for table in TABLES:
+        op.add_column(table, sa.Column('fingerprint', sa.BigInteger(), nullable=True))
+
+        # Backfill once here so the app only ever loads the stored integers.
+        rows = bind.execute(
+            sa.text(f"SELECT id, title, options FROM {table}").execution_options(yield_per=BATCH_SIZE)
+        )
+        update = sa.text(f"UPDATE {table} SET fingerprint = :fingerprint WHERE id = :id")
+        for partition in rows.partitions():
+            bind.execute(update, [
+                {'id': row.id, 'fingerprint': to_bigint(challenge_fingerprint(row._mapping))}
+                for row in partition
+            ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.drop_column(table, 'fingerprint')
@@ -1,12 +1,83 @@
-from src.logger import setup_logger
 import os
 
+from src.logger import setup_logger
+
+
+def default_worker_count() -> int:
+    return os.cpu_count() or 1
+
+
+def run_production(settings):
+    """Serve with gunicorn + uvicorn workers when available, else with uvicorn's own process manager."""
+    workers = settings.server_workers or default_worker_count()
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+
+    if BaseApplication is None:
+        import uvicorn
+
+        # uvicorn's supervisor imports the app in each worker, so there is no preload here.
+        uvicorn.run(
+            "src.app:app",
+            host=settings.server_host,
+            port=settings.server_port,
+            workers=workers,
+            loop="auto",
+            http="auto",
+            backlog=settings.server_backlog,
+            timeout_keep_alive=settings.server_keepalive_seconds,
+            timeout_graceful_shutdown=settings.server_graceful_timeout_seconds,
+            limit_max_requests=settings.server_max_requests or None,
+            log_config=None,
+            access_log=True,
+        )
+        return
+
+    try:
+        import uvicorn_worker  # noqa: F401
+        worker_class = "uvicorn_worker.UvicornWorker"
+    except ImportError:
+        worker_class = "uvicorn.workers.UvicornWorker"
+
+    class ProductionServer(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from src.app import app
+            return app
+
+    options = {
+        "bind": f"{settings.server_host}:{settings.server_port}",
+        "workers": workers,
+        "worker_class": worker_class,
+        "preload_app": settings.server_preload_app,
+        "backlog": settings.server_backlog,
+        "keepalive": settings.server_keepalive_seconds,
+        "max_requests": settings.server_max_requests,
+        "max_requests_jitter": settings.server_max_requests_jitter,
+        "graceful_timeout": settings.server_graceful_timeout_seconds,
+        "accesslog": "-",
+    }
+    ProductionServer(options).run()
+
+
 if __name__ == "__main__":
     import uvicorn
+    from src.core.config import settings
 
+    # Idempotent: the app calls it again on import, which is then a no-op.
     setup_logger()
 
-    environment = os.getenv("ENVIRONMENT", "development").lower()
+    environment = settings.environment.lower()
     is_dev = environment == "development"
 
     if is_dev:
@@ -19,12 +90,4 @@ if __name__ == "__main__":
             reload=True
         )
     else:
-        from src.app import app
-        uvicorn.run(
-            app,
-            host="0.0.0.0",
-            port=8000,
-            log_config=None,
-            access_log=True,
-            reload=False
-        )
+        run_production(settings)
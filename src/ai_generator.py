@@ -1,20 +1,43 @@
-import os
-from openai import OpenAI
-from typing import Dict, Any
+import asyncio
+import json
+import random
+import time
+from functools import lru_cache
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple, TypeVar
 
-from pydantic import BaseModel
-from dotenv import load_dotenv
+from jiter import from_json
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from .core.config import settings
 from .logger import get_logger
+from .metrics import Gauge, llm_generation_duration, llm_tokens, registry
+from .services.circuit_breaker import CircuitBreaker, CircuitOpenError, LatencyTracker, hedged
+from .services.single_flight import RequestCoalescer
 
-load_dotenv()
+logger = get_logger()
 
-secret_key = os.getenv('OPEN_AI_KEY')
+T = TypeVar('T')
 
-client = OpenAI(api_key=secret_key)
-logger = get_logger()
+_upstream_limiter: Optional[asyncio.Semaphore] = None
+
+openai_breaker = CircuitBreaker(
+    'OpenAI',
+    failure_threshold=settings.open_ai_breaker_failure_threshold,
+    latency_slo_seconds=settings.open_ai_breaker_latency_slo_seconds,
+    open_seconds=settings.open_ai_breaker_open_seconds,
+    probe_timeout_seconds=settings.open_ai_breaker_probe_timeout_seconds,
+)
+openai_latency = LatencyTracker()
+
+registry.register(Gauge(
+    'llm_circuit_state', 'OpenAI circuit breaker state (0 closed, 1 half-open, 2 open).',
+    function=lambda: {(): {'closed': 0, 'half_open': 1, 'open': 2}[openai_breaker.state]}
+))
 
 
+# extra='forbid' emits additionalProperties: false, which strict structured outputs require.
 class OptionsModel(BaseModel):
+    model_config = ConfigDict(extra='forbid')
+
     A: str
     B: str
     C: str
@@ -22,65 +45,315 @@ class OptionsModel(BaseModel):
 
 
 class QuestionModel(BaseModel):
+    model_config = ConfigDict(extra='forbid')
+
     title: str
     options: OptionsModel
-    correct_answer_id: int
+    correct_answer_id: int = Field(ge=0, le=3)
     explanation: str
 
 
-def generate_challenge_with_ai(difficulty: str) -> Dict[str, Any]:
-    system_prompt = """You are an expert coding challenge creator.
-        Your task is to generate a coding question with multiple choice answers.
-        The question should be appropriate for the specified difficulty level.
-        The question must be about python or back-end.
+class QuestionBatchModel(BaseModel):
+    model_config = ConfigDict(extra='forbid')
+
+    questions: List[QuestionModel]
+
+
+class ChallengeGenerationError(Exception):
+    """Raised when the upstream model could not produce a valid challenge."""
+
+
+SYSTEM_PROMPT = """You are an expert coding challenge creator.
+    Your task is to generate coding questions with multiple choice answers.
+    Each question should be appropriate for the specified difficulty level.
+    The question must be about python or back-end.
+
+    For easy questions: Focus on basic syntax, simple operations, or common programming concepts.
+    For medium questions: Cover intermediate concepts like data structures, algorithms, or language features.
+    For hard questions: Include advanced topics, design patterns, optimization techniques, or complex algorithms.
+
+    Return the challenges in the following JSON structure, with exactly as many entries in "questions" as requested:
+    {
+        "questions": [
+            {
+                "title": "The question title",
+                "options": {"A": "Option 1", "B": "Option 2", "C": "Option 3", "D": "Option 4"},
+                "correct_answer_id": 0, // Index of the correct answer (0-3)
+                "explanation": "Detailed explanation of why the correct answer is right"
+            }
+        ]
+    }
+    The 'options' field must be a JSON object with keys 'A', 'B', 'C', and 'D', each mapping to a string answer. Do not use a list or array for options.
+
+    Make sure the options are plausible but with only one clearly correct answer.
+    When asked for several questions, make every question cover a different topic.
+"""
+
+# Identifies SYSTEM_PROMPT for request coalescing; bump it whenever the prompt changes
+# so requests made under different prompts never share an upstream call.
+PROMPT_VARIANT = 'batch-v1'
 
-        For easy questions: Focus on basic syntax, simple operations, or common programming concepts.
-        For medium questions: Cover intermediate concepts like data structures, algorithms, or language features.
-        For hard questions: Include advanced topics, design patterns, optimization techniques, or complex algorithms.
+BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "name": "question_batch",
+    "schema": QuestionBatchModel.model_json_schema(),
+    "strict": True,
+}
 
-        Return the challenge in the following JSON structure:
-        {
-            "title": "The question title",
-            "options": {"A": "Option 1", "B": "Option 2", "C": "Option 3", "D": "Option 4"},
-            "correct_answer_id": 0, // Index of the correct answer (0-3)
-            "explanation": "Detailed explanation of why the correct answer is right"
-        }
-        The 'options' field must be a JSON object with keys 'A', 'B', 'C', and 'D', each mapping to a string answer. Do not use a list or array for options.
+FALLBACK_CHALLENGE = {
+    "title": "Basic Python List Operation",
+    "options": {
+        "A": "my_list.append(5)",
+        "B": "my_list.add(5)",
+        "C": "my_list.push(5)",
+        "D": "my_list.insert(5)",
+    },
+    "correct_answer_id": 0,
+    "explanation": "In Python, append() is the correct method to add an element to the end of a list."
+}
 
-        Make sure the options are plausible but with only one clearly correct answer.
+
+@lru_cache()
+def get_openai_client():
+    """AsyncOpenAI client, imported and built on first use (or during app startup)."""
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=settings.open_ai_key, base_url=settings.open_ai_base_url, max_retries=0)
+
+
+@lru_cache()
+def retryable_errors() -> tuple:
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+    return (
+        APIConnectionError,
+        APITimeoutError,
+        InternalServerError,
+        RateLimitError,
+        asyncio.TimeoutError,
+    )
+
+
+def get_upstream_limiter() -> asyncio.Semaphore:
+    """Global semaphore capping concurrent calls to the OpenAI API."""
+    global _upstream_limiter
+    if _upstream_limiter is None:
+        _upstream_limiter = asyncio.Semaphore(settings.open_ai_max_concurrency)
+    return _upstream_limiter
+
+
+async def _limited_call(call: Callable[[], Awaitable[T]]) -> T:
+    async with get_upstream_limiter():
+        start = time.monotonic()
+        result = await asyncio.wait_for(call(), timeout=settings.open_ai_timeout_seconds)
+    openai_latency.observe(time.monotonic() - start)
+    return result
+
+
+def _hedge_delay() -> float:
+    p95 = openai_latency.percentile(0.95)
+    return max(settings.open_ai_hedge_min_delay_seconds, p95 or settings.open_ai_timeout_seconds / 2)
+
+
+async def _attempt(call: Callable[[], Awaitable[T]]) -> T:
+    if settings.open_ai_hedging_enabled:
+        return await hedged(lambda: _limited_call(call), _hedge_delay())
+    return await _limited_call(call)
+
+
+async def call_with_retries(call: Callable[[], Awaitable[T]], description: str) -> T:
+    """Run an upstream call through the circuit breaker and concurrency limit.
+
+    Each attempt has its own timeout (and an optional hedged duplicate); transient
+    errors are retried with jittered backoff. Raises CircuitOpenError without
+    calling upstream while the circuit is open.
     """
-    try:
-        response = client.responses.parse(
-            model='gpt-4.1-nano',
-            instructions= system_prompt,
-            input= f'Generate a {difficulty} difficulty challenge',
-            text_format=QuestionModel,
-            temperature=0.7
-        )
-        challenge_data = response.output_parsed
+    attempts = settings.open_ai_max_retries + 1
+    for attempt in range(1, attempts + 1):
+        try:
+            return await openai_breaker.call(lambda: _attempt(call))
+        except retryable_errors() as e:
+            if attempt == attempts:
+                raise
+            delay = random.uniform(0, settings.open_ai_retry_base_delay * 2 ** (attempt - 1))
+            logger.warning(f"{description} failed on attempt {attempt}/{attempts} ({e!r}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
 
-        logger.info(f"AI challenge_data: {challenge_data}")
+def record_token_usage(response):
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return
+    llm_tokens.inc(usage.input_tokens, type='input')
+    llm_tokens.inc(usage.output_tokens, type='output')
 
-        challenge = QuestionModel.model_validate(challenge_data)
 
-        return {
+def parse_challenge_batch(output_text: str) -> List[Dict[str, Any]]:
+    """Validate each question of a batch on its own, dropping only the invalid ones."""
+    try:
+        items = json.loads(output_text).get("questions", [])
+    except (ValueError, AttributeError) as e:
+        raise ChallengeGenerationError(f"Malformed batch response: {e}") from e
+    if not isinstance(items, list):
+        raise ChallengeGenerationError("Malformed batch response: 'questions' is not a list")
+
+    challenges = []
+    for index, item in enumerate(items):
+        try:
+            challenge = QuestionModel.model_validate(item)
+        except ValidationError as e:
+            logger.warning(f"Dropping invalid question {index} from batch: {e}")
+            continue
+        challenges.append({
             "title": challenge.title,
             "options": challenge.options.model_dump(),
             "correct_answer_id": challenge.correct_answer_id,
             "explanation": challenge.explanation
-        }
+        })
+    return challenges
+
+
+async def request_challenge_batch(difficulty: str, count: int) -> List[Dict[str, Any]]:
+    """Generate up to `count` challenges with a single upstream call.
+
+    Raises ChallengeGenerationError if the call fails or no question in the batch is valid.
+    """
+    try:
+        response = await call_with_retries(
+            lambda: get_openai_client().responses.create(
+                model='gpt-4.1-nano',
+                instructions=SYSTEM_PROMPT,
+                input=f'Generate {count} {difficulty} difficulty challenge{"s" if count > 1 else ""}',
+                text={"format": BATCH_RESPONSE_FORMAT},
+                temperature=0.7
+            ),
+            f"OpenAI {difficulty} challenge batch request",
+        )
+    except Exception as e:
+        raise ChallengeGenerationError(str(e)) from e
+
+    record_token_usage(response)
+    challenges = parse_challenge_batch(response.output_text)
+    logger.info("AI generated {}/{} valid {} challenges", len(challenges), count, difficulty)
+    logger.opt(lazy=True).debug("AI challenge_data: {}", lambda: challenges)
+
+    if not challenges:
+        raise ChallengeGenerationError(f"No valid {difficulty} challenge in batch of {count}")
+    return challenges[:count]
+
+
+async def _request_coalesced_batch(key: Tuple[str, str], count: int) -> List[Dict[str, Any]]:
+    difficulty, _variant = key
+    return await request_challenge_batch(difficulty, count)
 
+
+coalesced_requests = RequestCoalescer(
+    _request_coalesced_batch,
+    window_seconds=settings.open_ai_coalesce_window_ms / 1000,
+    max_batch=settings.open_ai_coalesce_max_batch,
+)
+
+
+async def request_challenge(difficulty: str) -> Dict[str, Any]:
+    """Generate one challenge, raising ChallengeGenerationError instead of falling back.
+
+    Concurrent requests for the same difficulty and prompt variant share one
+    batched upstream call; each caller gets its own copy of a result.
+    """
+    if settings.open_ai_coalesce_enabled:
+        return dict(await coalesced_requests.request((difficulty, PROMPT_VARIANT)))
+    challenges = await request_challenge_batch(difficulty, 1)
+    return challenges[0]
+
+
+async def stream_challenge_with_ai(difficulty: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Stream one challenge, yielding ('title' | 'options' | 'challenge', data) as fields complete.
+
+    'title' and 'options' are emitted as soon as they are fully decoded from the partial
+    output; 'challenge' carries the complete validated challenge once the response ends.
+    Raises ChallengeGenerationError if the stream fails or the final output is invalid.
+    """
+    buffer = ''
+    emitted = set()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.open_ai_timeout_seconds
+    try:
+        openai_breaker.before_call()
+    except CircuitOpenError as e:
+        raise ChallengeGenerationError(str(e)) from e
+    start = time.monotonic()
+    finished = False
+    try:
+        async with get_upstream_limiter():
+            stream = await asyncio.wait_for(
+                get_openai_client().responses.create(
+                    model='gpt-4.1-nano',
+                    instructions=SYSTEM_PROMPT,
+                    input=f'Generate 1 {difficulty} difficulty challenge',
+                    text={"format": BATCH_RESPONSE_FORMAT},
+                    temperature=0.7,
+                    stream=True
+                ),
+                timeout=settings.open_ai_timeout_seconds
+            )
+            events = stream.__aiter__()
+            try:
+                while True:
+                    try:
+                        event = await asyncio.wait_for(anext(events), timeout=max(deadline - loop.time(), 0))
+                    except StopAsyncIteration:
+                        break
+                    if event.type == 'response.completed':
+                        record_token_usage(event.response)
+                    if event.type != 'response.output_text.delta':
+                        continue
+                    buffer += event.delta
+                    # Incomplete trailing strings are dropped, so any present field is fully decoded.
+                    partial = from_json(buffer.encode(), partial_mode=True)
+                    questions = partial.get('questions') if isinstance(partial, dict) else None
+                    if not questions or not isinstance(questions[0], dict):
+                        continue
+                    question = questions[0]
+                    if 'title' not in emitted and isinstance(question.get('title'), str):
+                        emitted.add('title')
+                        yield 'title', {'title': question['title']}
+                    options = question.get('options')
+                    if 'options' not in emitted and isinstance(options, dict) and all(key in options for key in 'ABCD'):
+                        emitted.add('options')
+                        yield 'options', {'options': options}
+            finally:
+                await stream.close()
+        finished = True
     except Exception as e:
-        logger.error(f"Failed to generate challenge with AI for difficulty {difficulty}")
-        logger.error(f"ERROR DETAILS: {e}")
-        return {
-            "title": "Basic Python List Operation",
-            "options": {
-                "A": "my_list.append(5)",
-                "B": "my_list.add(5)",
-                "C": "my_list.push(5)",
-                "D": "my_list.insert(5)",
-            },
-            "correct_answer_id": 0,
-            "explanation": "In Python, append() is the correct method to add an element to the end of a list."
-        }
\ No newline at end of file
+        finished = True
+        openai_breaker.record_failure()
+        raise ChallengeGenerationError(str(e)) from e
+    finally:
+        if not finished:
+            # Cancelled, or the consumer closed the generator mid-stream.
+            openai_breaker.release()
+    openai_breaker.record_success(time.monotonic() - start)
+
+    challenges = parse_challenge_batch(buffer)
+    if not challenges:
+        raise ChallengeGenerationError(f"No valid {difficulty} challenge in streamed response")
+    yield 'challenge', challenges[0]
+
+
+async def generate_challenge_with_ai(
+        difficulty: str,
+        fallback: Optional[Callable[[], Awaitable[Optional[Dict[str, Any]]]]] = None
+) -> Dict[str, Any]:
+    """Generate a challenge, degrading to `fallback()` and then FALLBACK_CHALLENGE on failure."""
+    start = time.perf_counter()
+    try:
+        challenge = await request_challenge(difficulty)
+    except ChallengeGenerationError as e:
+        if isinstance(e.__cause__, CircuitOpenError):
+            logger.warning(f"Skipping AI generation for difficulty {difficulty}: {e}")
+        else:
+            logger.error(f"Failed to generate challenge with AI for difficulty {difficulty}")
+            logger.error(f"ERROR DETAILS: {e}")
+        challenge = await fallback() if fallback is not None else None
+        llm_generation_duration.observe(time.perf_counter() - start, outcome='fallback')
+        return challenge or dict(FALLBACK_CHALLENGE)
+    llm_generation_duration.observe(time.perf_counter() - start, outcome='success')
+    return challenge
@@ -1,14 +1,72 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+import time
+from contextlib import asynccontextmanager
 
-from .routes import challenge, webhooks
-from .logger import get_logger
-from .core.config import settings
+from .core.startup import startup_report, startup_timings, timed
+
+with timed('import.fastapi'):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import ORJSONResponse, PlainTextResponse
+    from fastapi.middleware.cors import CORSMiddleware
+
+with timed('init.settings'):
+    from .core.config import settings
+
+with timed('init.logger'):
+    from .logger import get_log_queue_stats, get_logger, setup_logger
+    setup_logger()
+
+with timed('import.database'):
+    from .database.session import init_engine, dispose_engine, get_pool_stats
+    from .database.instrumentation import RequestQueryStats, get_query_stats, request_query_stats
+
+with timed('import.services'):
+    from .ai_generator import get_openai_client
+    from .dependencies.auth import load_jwt_key, token_cache
+    from .metrics import Gauge, http_request_duration, http_requests_in_progress, registry, render_metrics
+    from .services.challenge_index import challenge_index
+    from .services.challenge_pool import challenge_pool
+    from .services.webhook_batcher import quota_batcher
+
+with timed('import.routes'):
+    from .routes import challenge, webhooks
 
 logger = get_logger()
 logger.info("Starting Python Daily Challenge API")
 
-app = FastAPI()
+registry.register(Gauge(
+    'log_queue_records', 'Log records waiting in, or dropped by, the queued log sink.', ('state',),
+    function=lambda: {(state,): value for state, value in get_log_queue_stats().items()}
+))
+
+registry.register(Gauge(
+    'startup_component_seconds', 'Import and initialization time per component.', ('component',),
+    function=startup_timings
+))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with timed('init.jwt_key'):
+        load_jwt_key()
+    with timed('init.database_engine'):
+        init_engine()
+    with timed('init.openai_client'):
+        get_openai_client()
+    index_rebuild = asyncio.create_task(challenge_index.rebuild())
+    with timed('init.background_workers'):
+        await quota_batcher.start()
+        if settings.challenge_pool_enabled:
+            await challenge_pool.start()
+    logger.info("Startup timings (ms): {}", {k: round(v, 1) for k, v in startup_report().items()})
+    yield
+    index_rebuild.cancel()
+    await challenge_pool.stop()
+    await quota_batcher.stop()
+    await dispose_engine()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 if not settings.allowed_origins:
     raise ValueError("ALLOWED_ORIGINS for environment not set")
@@ -18,8 +76,86 @@ app.add_middleware(
     allow_origins=settings.allowed_origins.split(','),
     allow_credentials=True,
     allow_methods=['GET', 'POST', 'OPTIONS'],
-    allow_headers=['Content-Type', 'Authorization', 'Accept', 'Origin', 'X-Requested-With']
+    allow_headers=['Content-Type', 'Authorization', 'Accept', 'Origin', 'X-Requested-With', 'If-None-Match'],
+    # Lets cross-origin clients read the validator they send back as If-None-Match.
+    expose_headers=['ETag']
 )
 
+
+async def _observed_body(body, on_complete):
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        on_complete()
+
+
+@app.middleware('http')
+async def observe_requests(request: Request, call_next):
+    query_stats = RequestQueryStats()
+    token = request_query_stats.set(query_stats)
+    http_requests_in_progress.inc(method=request.method)
+    start = time.perf_counter()
+
+    def finish(status: int):
+        elapsed = time.perf_counter() - start
+        http_requests_in_progress.dec(method=request.method)
+        route = request.scope.get('route')
+        http_request_duration.observe(
+            elapsed,
+            method=request.method,
+            route=route.path if route is not None else 'unmatched',
+            status=status
+        )
+        # Per-request query counts make N+1s and regressions visible; uvicorn's access log has neither.
+        logger.info(
+            "{} {} -> {} in {:.1f} ms ({} queries, {:.1f} ms in db)",
+            request.method,
+            request.url.path,
+            status,
+            elapsed * 1000,
+            query_stats.count,
+            query_stats.total_ms,
+        )
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        finish(500)
+        raise
+    finally:
+        request_query_stats.reset(token)
+
+    # call_next returns once headers are ready; SSE and export bodies are still to come,
+    # so the request is only finished once the body has been sent.
+    response.body_iterator = _observed_body(response.body_iterator, lambda: finish(response.status_code))
+    return response
+
+
 app.include_router(challenge.router, prefix="/api")
 app.include_router(webhooks.router, prefix="/webhooks")
+
+
+@app.get('/health/db-pool')
+async def db_pool_health():
+    return get_pool_stats()
+
+
+@app.get('/health/auth-cache')
+async def auth_cache_health():
+    return token_cache.stats()
+
+
+@app.get('/health/db-queries')
+async def db_query_stats():
+    return get_query_stats()
+
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4')
+
+
+@app.get('/health/startup')
+async def startup_health():
+    return startup_report()
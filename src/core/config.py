@@ -1,25 +1,93 @@
 from functools import lru_cache
+from typing import Optional
 from pydantic_settings import BaseSettings
-from clerk_backend_api import Clerk
 
 
 class Settings(BaseSettings):
     # Database
     database_url: str
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 3600
+    slow_query_threshold_ms: float = 200
 
     # OpenAI
     open_ai_key: str
+    open_ai_base_url: Optional[str] = None
+    open_ai_max_concurrency: int = 8
+    open_ai_timeout_seconds: float = 30
+    open_ai_max_retries: int = 2
+    open_ai_retry_base_delay: float = 0.5
+    open_ai_breaker_failure_threshold: int = 5
+    open_ai_breaker_latency_slo_seconds: float = 15
+    open_ai_breaker_open_seconds: float = 30
+    open_ai_breaker_probe_timeout_seconds: float = 60
+    open_ai_hedging_enabled: bool = False
+    open_ai_hedge_min_delay_seconds: float = 2
+    open_ai_coalesce_enabled: bool = True
+    open_ai_coalesce_window_ms: float = 25
+    open_ai_coalesce_max_batch: int = 5
+
+    # Quota
+    initial_challenge_quota: int = 5
+    daily_challenge_quota: int = 3
+    quota_cache_ttl_seconds: float = 10
+    quota_cache_max_size: int = 10000
+
+    # Challenge pool
+    challenge_pool_enabled: bool = True
+    challenge_pool_size: int = 10
+    challenge_pool_low_water: int = 3
+    challenge_pool_refill_concurrency: int = 2
+    challenge_pool_batch_size: int = 5
+    challenge_pool_check_interval_seconds: float = 60
+
+    # Challenge deduplication
+    challenge_dedup_enabled: bool = True
+    challenge_dedup_max_distance: int = 3
+    challenge_dedup_max_attempts: int = 3
+    stored_challenge_candidates: int = 20
+
+    # History pagination
+    history_default_page_size: int = 20
+    history_max_page_size: int = 100
+    export_batch_size: int = 1000
 
     # Clerk Authentication
-    clerk_secret_key: str
     clerk_jwt_key: str
     clerk_authorized_parties: str
     clerk_webhook_secret: str
+    clerk_jwt_leeway_seconds: int = 5
+    auth_token_cache_size: int = 10000
+
+    # Webhook ingestion
+    webhook_batch_size: int = 100
+    webhook_flush_interval_ms: float = 200
+    webhook_dedup_window_size: int = 10000
+    webhook_dedup_ttl_seconds: float = 86400
 
     # Application
     environment: str = "development"
     allowed_origins: str
 
+    # Server (production mode of server.py)
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    server_workers: Optional[int] = None
+    server_preload_app: bool = True
+    server_backlog: int = 2048
+    server_keepalive_seconds: int = 5
+    server_max_requests: int = 10000
+    server_max_requests_jitter: int = 1000
+    server_graceful_timeout_seconds: int = 30
+
+    # Logging
+    log_queue_enabled: bool = True
+    log_queue_size: int = 10000
+    log_queue_overflow: str = "drop"
+    log_info_sample_rate: float = 1.0
+
     model_config = {
         "env_file": ".env",
         "env_file_encoding": "utf-8",
@@ -33,6 +101,5 @@ def get_settings() -> Settings:
     return Settings()
 
 
-# Initialize settings and Clerk SDK
+# Settings are loaded once per process; .env is read by pydantic-settings here.
 settings = get_settings()
-clerk_sdk = Clerk(bearer_auth=settings.clerk_secret_key)
@@ -0,0 +1,30 @@
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+# Seconds spent importing or initializing each component, in the order recorded.
+_timings: Dict[str, float] = {}
+
+
+def record(component: str, seconds: float):
+    _timings[component] = _timings.get(component, 0.0) + seconds
+
+
+@contextmanager
+def timed(component: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(component, time.perf_counter() - start)
+
+
+def startup_report() -> Dict[str, float]:
+    """Milliseconds per component, plus the total."""
+    report = {component: seconds * 1000 for component, seconds in _timings.items()}
+    report['total'] = sum(_timings.values()) * 1000
+    return report
+
+
+def startup_timings() -> Dict[tuple, float]:
+    return {(component,): seconds for component, seconds in _timings.items()}
@@ -1,37 +1,73 @@
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from sqlalchemy import case, delete, func, or_, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timedelta
+from typing import Optional, Sequence, Tuple
 from . import models
+from ..core.config import settings
 
-def get_challenge_quota(db: Session, user_id: str):
-    return (db.query(models.ChallengeQuota)
-                .filter(models.ChallengeQuota.user_id == user_id)
-                .first()
-            )
+async def get_challenge_quota(db: AsyncSession, user_id: str):
+    result = await db.execute(
+        select(models.ChallengeQuota)
+            .where(models.ChallengeQuota.user_id == user_id)
+    )
+    return result.scalars().first()
 
-def create_challenge_quota(db: Session, user_id: str):
-    db_quota = models.ChallengeQuota(user_id=user_id)
-    db.add(db_quota)
-    db.commit()
-    db.refresh(db_quota)
-    return db_quota
+async def consume_challenge_quota(db: AsyncSession, user_id: str):
+    """Atomically create, reset and decrement a user's quota in one statement.
 
-def reset_quota_if_needed(db: Session, quota: models.ChallengeQuota):
+    Returns the updated (quota_remaining, last_reset_date) row, or None when the
+    quota is exhausted. Concurrent calls for one user serialize on the row lock,
+    so the quota can never go negative.
+    """
     now = datetime.now()
-    if now - quota.last_reset_date > timedelta(hours=24):
-        quota.quota_remaining = 3
-        quota.last_reset_date = now
-        db.commit()
-        db.refresh(quota)
-    return quota
-
-def create_challenge(
-        db: Session,
+    quota = models.ChallengeQuota
+    needs_reset = or_(
+        quota.last_reset_date.is_(None),
+        quota.last_reset_date < now - timedelta(hours=24)
+    )
+    statement = (pg_insert(quota)
+                    .values(
+                        user_id=user_id,
+                        quota_remaining=settings.initial_challenge_quota - 1,
+                        last_reset_date=now
+                    )
+                    .on_conflict_do_update(
+                        index_elements=[quota.user_id],
+                        set_={
+                            'quota_remaining': case(
+                                (needs_reset, settings.daily_challenge_quota - 1),
+                                else_=quota.quota_remaining - 1
+                            ),
+                            'last_reset_date': case((needs_reset, now), else_=quota.last_reset_date),
+                        },
+                        where=or_(needs_reset, quota.quota_remaining > 0)
+                    )
+                    .returning(quota.quota_remaining, quota.last_reset_date)
+                )
+    result = await db.execute(statement)
+    row = result.first()
+    await db.commit()
+    return row
+
+async def refund_challenge_quota(db: AsyncSession, user_id: str):
+    """Give back a quota unit consumed by a generation that did not complete."""
+    await db.execute(
+        update(models.ChallengeQuota)
+            .where(models.ChallengeQuota.user_id == user_id)
+            .values(quota_remaining=models.ChallengeQuota.quota_remaining + 1)
+    )
+    await db.commit()
+
+async def create_challenge(
+        db: AsyncSession,
         difficulty: str,
         created_by: str,
         title: str,
-        options: str,
+        options: dict,
         correct_answer_id: int,
-        explanation: str
+        explanation: str,
+        fingerprint: Optional[int] = None
 ):
     db_challenge = models.Challenge(
         difficulty=difficulty,
@@ -39,16 +75,288 @@ def create_challenge(
         title=title,
         options=options,
         correct_answer_id=correct_answer_id,
-        explanation=explanation
+        explanation=explanation,
+        fingerprint=fingerprint
     )
     db.add(db_challenge)
-    db.commit()
-    db.refresh(db_challenge)
+    await db.commit()
+    await db.refresh(db_challenge)
     return db_challenge
 
-def get_user_challenges(db: Session, user_id: str):
-    return (db
-                .query(models.Challenge)
-                .filter(models.Challenge.created_by == user_id)
-                .all()
+HISTORY_COLUMNS = (
+    models.Challenge.id,
+    models.Challenge.difficulty,
+    models.Challenge.title,
+    models.Challenge.options,
+    models.Challenge.correct_answer_id,
+    models.Challenge.explanation,
+    models.Challenge.date_created,
+)
+
+async def get_user_challenges(
+        db: AsyncSession,
+        user_id: str,
+        limit: int,
+        before: Optional[Tuple[datetime, int]] = None
+):
+    """One page of a user's challenges, newest first.
+
+    `before` is the (date_created, id) keyset of the last row of the previous page.
+    """
+    query = (select(*HISTORY_COLUMNS)
+                .where(models.Challenge.created_by == user_id)
+                .order_by(models.Challenge.date_created.desc(), models.Challenge.id.desc())
+                .limit(limit)
+            )
+    if before is not None:
+        query = query.where(
+            tuple_(models.Challenge.date_created, models.Challenge.id) < tuple_(*before)
+        )
+    result = await db.execute(query)
+    return result.all()
+
+async def get_user_history_version(db: AsyncSession, user_id: str) -> Tuple[int, Optional[int]]:
+    """(count, max id) of a user's challenges; changes whenever a challenge is added or removed.
+
+    Answered from the (created_by, date_created, id) index without fetching any rows.
+    """
+    result = await db.execute(
+        select(func.count(models.Challenge.id), func.max(models.Challenge.id))
+            .where(models.Challenge.created_by == user_id)
+    )
+    count, max_id = result.one()
+    return count, max_id
+
+async def get_stored_challenges(
+        db: AsyncSession,
+        difficulty: str,
+        exclude_user_id: str,
+        exclude_title: str,
+        limit: int
+):
+    """A few stored challenges of `difficulty` not created by `exclude_user_id`.
+
+    Starts from a random id rather than ORDER BY random() so the primary key index
+    is used; wraps around to the lowest ids when the random start finds nothing.
+    """
+    query = (select(models.Challenge.title,
+                    models.Challenge.options,
+                    models.Challenge.correct_answer_id,
+                    models.Challenge.explanation,
+                    models.Challenge.fingerprint)
+                .where(models.Challenge.difficulty == difficulty)
+                .where(models.Challenge.created_by != exclude_user_id)
+                .where(models.Challenge.title != exclude_title)
+                .order_by(models.Challenge.id)
+                .limit(limit)
+            )
+    random_start = select(func.floor(func.random() * func.max(models.Challenge.id))).scalar_subquery()
+    result = await db.execute(query.where(models.Challenge.id >= random_start))
+    rows = result.all()
+    if not rows:
+        result = await db.execute(query)
+        rows = result.all()
+    return [dict(row._mapping) for row in rows]
+
+EXPORT_COLUMNS = (
+    models.Challenge.id,
+    models.Challenge.created_by,
+    models.Challenge.difficulty,
+    models.Challenge.title,
+    models.Challenge.options,
+    models.Challenge.correct_answer_id,
+    models.Challenge.explanation,
+    models.Challenge.date_created,
+)
+
+async def stream_user_challenges(db: AsyncSession, user_id: Optional[str] = None):
+    """Server-side cursor over a user's challenges (every user's when user_id is None), oldest first."""
+    query = select(*EXPORT_COLUMNS).order_by(models.Challenge.id)
+    if user_id is not None:
+        query = query.where(models.Challenge.created_by == user_id)
+    return await db.stream(query.execution_options(yield_per=settings.export_batch_size))
+
+async def count_pooled_challenges(db: AsyncSession, difficulty: str) -> int:
+    result = await db.execute(
+        select(func.count(models.PooledChallenge.id))
+            .where(models.PooledChallenge.difficulty == difficulty)
+    )
+    return result.scalar_one()
+
+async def try_lock_challenge_pool(db: AsyncSession, difficulty: str) -> bool:
+    """Try to take a transaction-scoped advisory lock on refilling one difficulty's pool.
+
+    Returns False when another worker holds it. Released when the caller's
+    transaction ends.
+    """
+    result = await db.execute(
+        text('SELECT pg_try_advisory_xact_lock(hashtext(:key))'),
+        {'key': f"challenge_pool:{difficulty}"}
+    )
+    return result.scalar_one()
+
+async def add_pooled_challenges(
+        db: AsyncSession,
+        difficulty: str,
+        challenges: list[dict],
+        fingerprints: Sequence[Optional[int]]
+):
+    pooled = [
+        models.PooledChallenge(
+            difficulty=difficulty,
+            title=challenge['title'],
+            options=challenge['options'],
+            correct_answer_id=challenge['correct_answer_id'],
+            explanation=challenge['explanation'],
+            fingerprint=fingerprint
+        )
+        for challenge, fingerprint in zip(challenges, fingerprints)
+    ]
+    db.add_all(pooled)
+    await db.commit()
+    return pooled
+
+async def pop_pooled_challenge(db: AsyncSession, difficulty: str, exclude_ids: Sequence[int] = ()):
+    """Claim and delete the oldest pooled challenge not in exclude_ids. The caller commits."""
+    oldest = (select(models.PooledChallenge.id)
+                .where(models.PooledChallenge.difficulty == difficulty)
+                .order_by(models.PooledChallenge.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+    if exclude_ids:
+        oldest = oldest.where(models.PooledChallenge.id.not_in(exclude_ids))
+    result = await db.execute(
+        delete(models.PooledChallenge)
+            .where(models.PooledChallenge.id == oldest.scalar_subquery())
+            .returning(
+                models.PooledChallenge.id,
+                models.PooledChallenge.title,
+                models.PooledChallenge.options,
+                models.PooledChallenge.correct_answer_id,
+                models.PooledChallenge.explanation,
+                models.PooledChallenge.fingerprint
+            )
+    )
+    row = result.first()
+    return dict(row._mapping) if row else None
+
+async def stream_challenge_fingerprints(db: AsyncSession):
+    """Server-side cursor over the stored fingerprint of every challenge that has one."""
+    return await db.stream(
+        select(models.Challenge.fingerprint)
+            .where(models.Challenge.fingerprint.is_not(None))
+            .execution_options(yield_per=10000)
+    )
+
+async def stream_unfingerprinted_challenges(db: AsyncSession):
+    """Challenges written without a fingerprint, e.g. by an older release during a rolling deploy."""
+    return await db.stream(
+        select(models.Challenge.title, models.Challenge.options)
+            .where(models.Challenge.fingerprint.is_(None))
+            .execution_options(yield_per=1000)
+    )
+
+async def get_user_fingerprints(db: AsyncSession, user_id: str):
+    """Stored fingerprints of a user's challenges, plus the content of any stored without one."""
+    user_rows = models.Challenge.created_by == user_id
+    result = await db.execute(
+        select(models.Challenge.fingerprint)
+            .where(user_rows, models.Challenge.fingerprint.is_not(None))
+    )
+    fingerprints = list(result.scalars().all())
+    result = await db.execute(
+        select(models.Challenge.title, models.Challenge.options)
+            .where(user_rows, models.Challenge.fingerprint.is_(None))
+    )
+    return fingerprints, [dict(row._mapping) for row in result.all()]
+
+async def stream_pooled_challenge_contents(db: AsyncSession):
+    return await db.stream(
+        select(
+            models.PooledChallenge.id,
+            models.PooledChallenge.difficulty,
+            models.PooledChallenge.fingerprint,
+            models.PooledChallenge.title,
+            models.PooledChallenge.options
+        ).execution_options(yield_per=1000)
+    )
+
+async def create_challenge_quotas(db: AsyncSession, user_ids: Sequence[str]):
+    """Insert quotas for many users at once, skipping users that already have one.
+
+    Returns the (user_id, quota_remaining, last_reset_date) rows actually inserted.
+    """
+    now = datetime.now()
+    result = await db.execute(
+        pg_insert(models.ChallengeQuota)
+            .values([
+                {'user_id': user_id, 'quota_remaining': settings.initial_challenge_quota, 'last_reset_date': now}
+                for user_id in user_ids
+            ])
+            .on_conflict_do_nothing(index_elements=[models.ChallengeQuota.user_id])
+            .returning(
+                models.ChallengeQuota.user_id,
+                models.ChallengeQuota.quota_remaining,
+                models.ChallengeQuota.last_reset_date
+            )
+    )
+    rows = result.all()
+    await db.commit()
+    return rows
+
+DAILY_CHALLENGE_COLUMNS = (
+    models.DailyChallenge.id,
+    models.DailyChallenge.challenge_date,
+    models.DailyChallenge.difficulty,
+    models.DailyChallenge.title,
+    models.DailyChallenge.options,
+    models.DailyChallenge.correct_answer_id,
+    models.DailyChallenge.explanation,
+)
+
+async def get_daily_challenge(db: AsyncSession, challenge_date: date, difficulty: str):
+    result = await db.execute(
+        select(*DAILY_CHALLENGE_COLUMNS)
+            .where(models.DailyChallenge.challenge_date == challenge_date)
+            .where(models.DailyChallenge.difficulty == difficulty)
+    )
+    row = result.first()
+    return dict(row._mapping) if row else None
+
+async def lock_daily_challenge(db: AsyncSession, challenge_date: date, difficulty: str):
+    """Take a transaction-scoped advisory lock so only one worker generates a given day's challenge.
+
+    Released when the caller commits or rolls back.
+    """
+    await db.execute(
+        text('SELECT pg_advisory_xact_lock(hashtext(:key))'),
+        {'key': f"daily_challenge:{challenge_date.isoformat()}:{difficulty}"}
+    )
+
+async def create_daily_challenge(db: AsyncSession, challenge_date: date, difficulty: str, challenge: dict):
+    result = await db.execute(
+        pg_insert(models.DailyChallenge)
+            .values(
+                challenge_date=challenge_date,
+                difficulty=difficulty,
+                date_created=datetime.now(),
+                title=challenge['title'],
+                options=challenge['options'],
+                correct_answer_id=challenge['correct_answer_id'],
+                explanation=challenge['explanation']
             )
+            .returning(*DAILY_CHALLENGE_COLUMNS)
+    )
+    row = result.first()
+    await db.commit()
+    return dict(row._mapping)
+
+async def assign_daily_challenge(db: AsyncSession, user_id: str, daily_challenge_id: int):
+    """Record that a user was served a daily challenge; repeat requests are no-ops."""
+    await db.execute(
+        pg_insert(models.DailyChallengeAssignment)
+            .values(user_id=user_id, daily_challenge_id=daily_challenge_id, date_assigned=datetime.now())
+            .on_conflict_do_nothing()
+    )
+    await db.commit()
@@ -0,0 +1,116 @@
+import re
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from ..core.config import settings
+from ..logger import get_logger
+from ..metrics import db_query_duration
+
+logger = get_logger()
+
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:(?:\$\d+|\?|%\(\w+\)s|%s)\s*,\s*)+(?:\$\d+|\?|%\(\w+\)s|%s)\s*\)')
+_PLACEHOLDER = re.compile(r'\$\d+|%\(\w+\)s|%s')
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(statement: str) -> str:
+    """Collapse a SQL statement to its shape: no literals, no parameter names, single spaces."""
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    statement = _STRING_LITERAL.sub('?', statement)
+    statement = _PLACEHOLDER_LIST.sub('(?, ...)', statement)
+    statement = _PLACEHOLDER.sub('?', statement)
+    return _NUMBER_LITERAL.sub('?', statement)
+
+
+class StatementStats:
+    """Latency histogram for one normalized statement."""
+
+    __slots__ = ('count', 'total_ms', 'max_ms', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def as_dict(self) -> dict:
+        labels = [f"le_{bound}ms" for bound in LATENCY_BUCKETS_MS] + ['le_inf']
+        return {
+            'count': self.count,
+            'avg_ms': self.total_ms / self.count if self.count else 0.0,
+            'max_ms': self.max_ms,
+            'histogram': dict(zip(labels, self.buckets)),
+        }
+
+
+class RequestQueryStats:
+    """Queries issued while handling one request."""
+
+    __slots__ = ('count', 'total_ms')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+
+
+statement_stats: Dict[str, StatementStats] = {}
+request_query_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar('request_query_stats', default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info['query_start_time'].pop()) * 1000
+    normalized = normalize_statement(statement)
+
+    stats = statement_stats.get(normalized)
+    if stats is None:
+        stats = statement_stats[normalized] = StatementStats()
+    stats.observe(elapsed_ms)
+    db_query_duration.observe(elapsed_ms / 1000)
+
+    current_request = request_query_stats.get()
+    if current_request is not None:
+        current_request.count += 1
+        current_request.total_ms += elapsed_ms
+
+    if elapsed_ms >= settings.slow_query_threshold_ms:
+        logger.warning("Slow query ({:.1f} ms): {}", elapsed_ms, normalized)
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get('query_start_time') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine: Engine):
+    """Attach timing listeners to a (sync) engine."""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+def get_query_stats() -> dict:
+    """Per-statement timing histograms, slowest average first."""
+    ordered = sorted(statement_stats.items(), key=lambda item: item[1].total_ms / item[1].count, reverse=True)
+    return {statement: stats.as_dict() for statement, stats in ordered}
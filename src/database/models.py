@@ -1,11 +1,28 @@
-from sqlalchemy import Column, Integer, String, DateTime, create_engine
+from sqlalchemy import BigInteger, Column, Integer, String, Date, DateTime, ForeignKey, Index, JSON, UniqueConstraint
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime
-import os
 
 Base = declarative_base()
 
+OptionsType = JSON().with_variant(JSONB(), 'postgresql')
+
+class Fingerprint(TypeDecorator):
+    """Unsigned 64-bit SimHash stored in a signed BIGINT column."""
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value >= 1 << 63:
+            value -= 1 << 64
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None and value < 0:
+            value += 1 << 64
+        return value
+
 class Challenge(Base):
     __tablename__ = 'challenges'
 
@@ -14,9 +31,14 @@ class Challenge(Base):
     date_created = Column(DateTime, default=datetime.now)
     created_by = Column(String, nullable=False)
     title = Column(String, nullable=False)
-    options = Column(String, nullable=False)
+    options = Column(OptionsType, nullable=False)
     correct_answer_id = Column(Integer, nullable=False)
     explanation = Column(String, nullable=False)
+    fingerprint = Column(Fingerprint, nullable=True)
+
+    __table_args__ = (
+        Index('ix_challenges_created_by_date_created_id', 'created_by', 'date_created', 'id'),
+    )
 
 class ChallengeQuota(Base):
     __tablename__ = 'challenge_quotas'
@@ -25,32 +47,38 @@ class ChallengeQuota(Base):
     quota_remaining = Column(Integer, nullable=False, default=5)
     last_reset_date = Column(DateTime, default=datetime.now)
 
-def get_engine():
-    database_url = os.environ.get('DATABASE_URL')
-
-    if not database_url:
-        raise ValueError("DATABASE_URL environment variable is required.")
-
-    return create_engine(
-        database_url,
-        echo=True,
-        pool_size=10,
-        pool_recycle=3600,
-        pool_pre_ping=True,
-        connect_args={
-            "connect_timeout": 10
-        }
-    )
+class PooledChallenge(Base):
+    __tablename__ = 'challenge_pool'
 
-def get_db():
-    engine = get_engine()
-    session_local = sessionmaker(
-        autocommit=False,
-        autoflush=False,
-        bind=engine
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    difficulty = Column(String, nullable=False, index=True)
+    date_created = Column(DateTime, default=datetime.now)
+    title = Column(String, nullable=False)
+    options = Column(OptionsType, nullable=False)
+    correct_answer_id = Column(Integer, nullable=False)
+    explanation = Column(String, nullable=False)
+    fingerprint = Column(Fingerprint, nullable=True)
+
+class DailyChallenge(Base):
+    """The one shared challenge for a difficulty on a UTC day."""
+    __tablename__ = 'daily_challenges'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    challenge_date = Column(Date, nullable=False)
+    difficulty = Column(String, nullable=False)
+    date_created = Column(DateTime, default=datetime.now)
+    title = Column(String, nullable=False)
+    options = Column(OptionsType, nullable=False)
+    correct_answer_id = Column(Integer, nullable=False)
+    explanation = Column(String, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('challenge_date', 'difficulty', name='uq_daily_challenges_date_difficulty'),
     )
-    db = session_local()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+class DailyChallengeAssignment(Base):
+    __tablename__ = 'daily_challenge_assignments'
+
+    user_id = Column(String, primary_key=True)
+    daily_challenge_id = Column(Integer, ForeignKey('daily_challenges.id', ondelete='CASCADE'), primary_key=True)
+    date_assigned = Column(DateTime, default=datetime.now)
@@ -0,0 +1,155 @@
+import time
+from typing import Optional
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from ..core.config import settings
+from .instrumentation import instrument_engine
+from ..logger import get_logger
+from ..metrics import Gauge, db_pool_checkout_wait, registry
+
+logger = get_logger()
+
+_engine: Optional[AsyncEngine] = None
+_session_local: Optional[async_sessionmaker[AsyncSession]] = None
+
+
+class PoolStats:
+    """Process-wide counters describing connection checkouts from the pool."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, wait_seconds: float):
+        self.checkouts += 1
+        self.total_wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """QueuePool that records how long callers wait to check out a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        wait_seconds = time.perf_counter() - start
+        pool_stats.record(wait_seconds)
+        db_pool_checkout_wait.observe(wait_seconds)
+        return connection
+
+
+def get_async_database_url(database_url: str) -> str:
+    """Point a plain postgresql:// URL at the asyncpg driver."""
+    url = make_url(database_url)
+    if url.drivername in ('postgresql', 'postgresql+psycopg2', 'postgres'):
+        url = url.set(drivername='postgresql+asyncpg')
+    return url.render_as_string(hide_password=False)
+
+
+def init_engine() -> AsyncEngine:
+    """Create the process-wide async engine and session factory."""
+    global _engine, _session_local
+
+    if _engine is not None:
+        return _engine
+
+    if not settings.database_url:
+        raise ValueError("DATABASE_URL environment variable is required.")
+
+    _engine = create_async_engine(
+        get_async_database_url(settings.database_url),
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=True,
+        connect_args={
+            "timeout": 10
+        }
+    )
+    instrument_engine(_engine.sync_engine)
+    _session_local = async_sessionmaker(
+        _engine,
+        autoflush=False,
+        expire_on_commit=False
+    )
+    logger.info(
+        f"Database engine initialized (pool_size={settings.db_pool_size}, "
+        f"max_overflow={settings.db_max_overflow}, pool_timeout={settings.db_pool_timeout}s)"
+    )
+    return _engine
+
+
+async def dispose_engine():
+    """Close every pooled connection and drop the engine."""
+    global _engine, _session_local
+
+    if _engine is None:
+        return
+
+    await _engine.dispose()
+    _engine = None
+    _session_local = None
+    logger.info("Database engine disposed")
+
+
+def get_engine() -> AsyncEngine:
+    if _engine is None:
+        return init_engine()
+    return _engine
+
+
+def get_session_factory() -> async_sessionmaker[AsyncSession]:
+    """Session factory for work that runs outside a request, e.g. background tasks."""
+    if _session_local is None:
+        init_engine()
+    return _session_local
+
+
+def get_pool_stats() -> dict:
+    """Current pool occupancy plus cumulative checkout wait statistics."""
+    pool = get_engine().sync_engine.pool
+    checkouts = pool_stats.checkouts
+    return {
+        'pool_size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': pool.overflow(),
+        'checkouts': checkouts,
+        'timeouts': pool_stats.timeouts,
+        'avg_wait_ms': (pool_stats.total_wait_seconds / checkouts * 1000) if checkouts else 0.0,
+        'max_wait_ms': pool_stats.max_wait_seconds * 1000,
+    }
+
+
+def _pool_connections() -> dict:
+    if _engine is None:
+        return {}
+    pool = _engine.sync_engine.pool
+    return {('checked_out',): pool.checkedout(), ('checked_in',): pool.checkedin(), ('overflow',): pool.overflow()}
+
+
+registry.register(Gauge(
+    'db_pool_connections', 'Connections in the database pool by state.', ('state',), function=_pool_connections
+))
+
+
+async def get_db():
+    if _session_local is None:
+        init_engine()
+    async with _session_local() as db:
+        yield db
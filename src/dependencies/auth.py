@@ -1,28 +1,109 @@
-from typing import Annotated
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Annotated, Optional, Tuple
 
-from clerk_backend_api import AuthenticateRequestOptions, Requestish
-from fastapi import HTTPException, Depends
+import jwt
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from fastapi import HTTPException, Depends, Request
 
-from src.core.config import clerk_sdk, settings
+from src.core.config import settings
 from src.schemas.auth import UserData
 
-def authenticate_and_get_user_details(request: Requestish) -> UserData:
+_jwt_key = None
+
+
+class TokenCache:
+    """Bounded LRU of verified token hashes, each entry expiring at the token's exp."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, Tuple[UserData, float]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[UserData]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return user
+
+    def set(self, key: str, user: UserData, expires_at: float):
+        self._entries[key] = (user, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+token_cache = TokenCache(settings.auth_token_cache_size)
+
+
+def load_jwt_key():
+    """Parse CLERK_JWT_KEY once so each verification reuses the public key object."""
+    global _jwt_key
+    if _jwt_key is None:
+        pem = settings.clerk_jwt_key.replace('\\n', '\n').encode()
+        _jwt_key = load_pem_public_key(pem)
+    return _jwt_key
+
+
+def _get_session_token(request: Request) -> Optional[str]:
+    authorization = request.headers.get('authorization')
+    if authorization:
+        scheme, _, token = authorization.partition(' ')
+        if scheme.lower() == 'bearer' and token:
+            return token.strip()
+    return request.cookies.get('__session')
+
+
+def _verify_session_token(token: str) -> dict:
+    payload = jwt.decode(
+        token,
+        key=load_jwt_key(),
+        algorithms=['RS256'],
+        leeway=settings.clerk_jwt_leeway_seconds,
+        options={'require': ['exp', 'sub']},
+    )
+    authorized_parties = [party.strip() for party in settings.clerk_authorized_parties.split(',') if party.strip()]
+    azp = payload.get('azp')
+    if azp and authorized_parties and azp not in authorized_parties:
+        raise jwt.InvalidTokenError(f'Invalid authorized party {azp}')
+    return payload
+
+
+def authenticate_and_get_user_details(request: Request) -> UserData:
+    token = _get_session_token(request)
+    if not token:
+        raise HTTPException(status_code=401, detail='Missing token')
+
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    user = token_cache.get(cache_key)
+    if user is not None:
+        return user
+
     try:
-        request_state = clerk_sdk.authenticate_request(
-            request,
-            AuthenticateRequestOptions(
-                authorized_parties=settings.clerk_authorized_parties,
-                jwt_key=settings.clerk_jwt_key,
-            )
-        )
-        if not request_state.is_signed_in:
-            raise HTTPException(status_code=401, detail='Invalid token')
-
-        user_id = request_state.payload.get('sub')
-
-        return UserData(user_id=user_id)
-    except Exception as e:
-        # TODO: Error handling and logging
-        raise HTTPException(status_code=500, detail=str(e))
-
-auth_dependency = Annotated[UserData, Depends(authenticate_and_get_user_details)]
\ No newline at end of file
+        payload = _verify_session_token(token)
+    except jwt.PyJWTError as e:
+        raise HTTPException(status_code=401, detail=f'Invalid token: {e}')
+
+    user = UserData(user_id=payload['sub'])
+    token_cache.set(cache_key, user, float(payload['exp']))
+    return user
+
+auth_dependency = Annotated[UserData, Depends(authenticate_and_get_user_details)]
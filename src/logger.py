@@ -1,10 +1,16 @@
+import atexit
+import json
 import os
+import queue
+import random
 import sys
+import threading
 import logging
 from loguru import logger
-from dotenv import load_dotenv
 
-load_dotenv()
+_queued_sink = None
+_configured = False
+
 
 class InterceptHandler(logging.Handler):
     """Intercept standard logging messages toward loguru."""
@@ -15,20 +21,147 @@ class InterceptHandler(logging.Handler):
         except ValueError:
             level = record.levelno
 
-        frame, depth = sys._getframe(6), 6
-        while frame and frame.f_code.co_filename == logging.__file__:
-            frame = frame.f_back
-            depth += 1
+        # The stdlib record already knows its origin, so no need to walk the stack for it.
+        logger.patch(
+            lambda r: r.update(name=record.name, function=record.funcName, line=record.lineno)
+        ).opt(exception=record.exc_info).log(level, record.getMessage())
+
+
+class QueuedSink:
+    """Loguru sink that hands records to a background writer thread through a bounded queue.
+
+    The event loop only enqueues the record; serialization and the blocking write
+    happen on the writer thread. When the queue is full, records are dropped and
+    counted ("drop") or the caller waits for space ("block").
+    """
+
+    _STOP = object()
+
+    def __init__(self, stream, max_size: int, overflow: str, serialize: bool):
+        self.stream = stream
+        self.block = overflow == "block"
+        self.serialize = serialize
+        self.dropped = 0
+        self.max_size = max_size
+        self.start()
+
+    def start(self):
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._thread = threading.Thread(target=self._drain, name="log-writer", daemon=True)
+        self._thread.start()
 
-        logger.opt(depth=depth, exception=record.exc_info).log(
-            level, record.getMessage()
+    def write(self, message):
+        if self.block:
+            self._queue.put(message)
+            return
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        if not self._thread.is_alive():
+            return
+        self._queue.put(self._STOP)
+        self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "dropped": self.dropped}
+
+    def _format(self, message) -> str:
+        """Build the same JSON line loguru writes with serialize=True.
+
+        The sink is added with format "{message}", so `message` is the bare message
+        followed by loguru's formatted exception, if any.
+        """
+        if not self.serialize:
+            return message
+        record = message.record
+        time = record["time"]
+        text = (
+            f"{time:%Y-%m-%d %H:%M:%S}.{time.microsecond // 1000:03d} | {record['level'].name: <8} | "
+            f"{record['name']}:{record['function']}:{record['line']} | {message}"
         )
+        exception = record["exception"]
+        if exception is not None:
+            exception = {
+                "type": None if exception.type is None else exception.type.__name__,
+                "value": exception.value,
+                "traceback": bool(exception.traceback),
+            }
+        line = {
+            "text": text,
+            "record": {
+                "elapsed": {"repr": record["elapsed"], "seconds": record["elapsed"].total_seconds()},
+                "exception": exception,
+                "extra": record["extra"],
+                "file": {"name": record["file"].name, "path": record["file"].path},
+                "function": record["function"],
+                "level": {"icon": record["level"].icon, "name": record["level"].name, "no": record["level"].no},
+                "line": record["line"],
+                "message": record["message"],
+                "module": record["module"],
+                "name": record["name"],
+                "process": {"id": record["process"].id, "name": record["process"].name},
+                "thread": {"id": record["thread"].id, "name": record["thread"].name},
+                "time": {"repr": time, "timestamp": time.timestamp()},
+            },
+        }
+        return json.dumps(line, default=str, ensure_ascii=False) + "\n"
+
+    def _drain(self):
+        while True:
+            message = self._queue.get()
+            if message is self._STOP:
+                break
+            try:
+                self.stream.write(self._format(message))
+                if self._queue.empty():
+                    self.stream.flush()
+            except Exception:
+                pass
+        try:
+            self.stream.flush()
+        except (OSError, ValueError):
+            # The stream may already be closed at interpreter exit.
+            pass
 
-def setup_logger():
-    """Configure loguru logger based on environment."""
+
+def _restart_queued_sink():
+    # Threads do not survive fork, e.g. when a preloaded app forks its workers.
+    if _queued_sink is not None:
+        _queued_sink.start()
+
+
+os.register_at_fork(after_in_child=_restart_queued_sink)
+
+
+def _sample_info(rate: float):
+    def log_filter(record) -> bool:
+        return record["level"].no != logging.INFO or random.random() < rate
+    return log_filter
+
+
+def setup_logger(force: bool = False, stream=None):
+    """Configure loguru logger based on environment. Later calls are no-ops unless forced.
+
+    Logs go to `stream`, stdout by default.
+    """
+    global _queued_sink, _configured
+    from .core.config import get_settings
+
+    if _configured and not force:
+        return logger
+    _configured = True
+
+    settings = get_settings()
+    stream = stream or sys.stdout
     logger.remove()
+    if _queued_sink is not None:
+        _queued_sink.stop()
+        _queued_sink = None
 
-    environment = os.getenv("ENVIRONMENT", "development").lower()
+    environment = settings.environment.lower()
     is_prod = environment == "production"
 
     config = {
@@ -41,8 +174,25 @@ def setup_logger():
         "backtrace": not is_prod,
         "diagnose": not is_prod
     }
+    if settings.log_info_sample_rate < 1:
+        config["filter"] = _sample_info(settings.log_info_sample_rate)
 
-    logger.add(sys.stdout, **config)
+    if settings.log_queue_enabled:
+        _queued_sink = QueuedSink(
+            stream,
+            max_size=settings.log_queue_size,
+            overflow=settings.log_queue_overflow,
+            serialize=config["serialize"],
+        )
+        atexit.register(_queued_sink.stop)
+        if config["serialize"]:
+            # Only the raw record crosses the queue; the writer thread builds the JSON line.
+            # loguru appends "\n{exception}" to the format itself.
+            config["format"] = "{message}"
+            config["serialize"] = False
+        logger.add(_queued_sink.write, **config)
+    else:
+        logger.add(stream, **config)
 
     intercept_handler = InterceptHandler()
     logging.root.handlers = [intercept_handler]
@@ -57,8 +207,12 @@ def setup_logger():
     logger.info(f"Logger configured for {environment} environment with level {config['level']}")
     return logger
 
+def get_log_queue_stats() -> dict:
+    """Queue depth and dropped-record count of the queued sink, if enabled."""
+    if _queued_sink is None:
+        return {"queued": 0, "dropped": 0}
+    return _queued_sink.stats()
+
 def get_logger():
     """Get the configured loguru logger instance."""
     return logger
-
-setup_logger()
@@ -1,20 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import base64
+import hashlib
 import json
+import orjson
 from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
 
-from ..ai_generator import generate_challenge_with_ai
+from ..ai_generator import (
+    FALLBACK_CHALLENGE,
+    ChallengeGenerationError,
+    generate_challenge_with_ai,
+    openai_breaker,
+    stream_challenge_with_ai
+)
 from ..database.db import (
     get_challenge_quota,
+    consume_challenge_quota,
+    refund_challenge_quota,
     create_challenge,
-    create_challenge_quota,
-    reset_quota_if_needed,
-    get_user_challenges
+    get_stored_challenges,
+    get_user_challenges,
+    get_user_history_version,
+    stream_user_challenges,
+    EXPORT_COLUMNS
 )
-from ..utils import authenticate_and_get_user_details
-from ..database.models import get_db
+from ..dependencies.auth import authenticate_and_get_user_details
+from ..schemas.challenge import ChallengeResponse, HistoryResponse, QuotaResponse
+from ..database.session import get_db, get_session_factory
+from ..core.config import settings
 from ..logger import get_logger
+from ..metrics import quota_exhausted
+from ..services.challenge_index import SeenFingerprints, challenge_index, load_seen_fingerprints
+from ..services.fingerprint import challenge_fingerprint
+from ..services.challenge_pool import challenge_pool
+from ..services.daily_challenge import daily_challenges
+from ..services.export import EXPORT_FORMATS, export_rows
+from ..services.quota_cache import quota_cache
 
 router = APIRouter()
 logger = get_logger()
@@ -25,123 +49,422 @@ class ChallengeRequest(BaseModel):
     class Config:
         json_schema_extra = {'example': {'difficulty': 'easy'}}
 
-@router.post('/generate-challenge')
+async def reserve_quota(db: AsyncSession, user_id: str):
+    quota = await consume_challenge_quota(db, user_id)
+    if quota is None:
+        quota_exhausted.inc()
+        logger.warning(f"User {user_id} quota exhausted")
+        raise HTTPException(status_code=429, detail='Quota exhausted')
+    quota_cache.set(user_id, quota.quota_remaining, quota.last_reset_date)
+    return quota
+
+async def release_quota(db: AsyncSession, user_id: str):
+    logger.warning(f"Refunding quota for user {user_id} after failed generation")
+    await db.rollback()
+    await refund_challenge_quota(db, user_id)
+    quota_cache.invalidate(user_id)
+
+def stored_fingerprint(challenge_data: dict) -> int:
+    """The fingerprint carried over from the pool or challenges table, else computed now."""
+    fingerprint = challenge_data.get('fingerprint')
+    return challenge_fingerprint(challenge_data) if fingerprint is None else fingerprint
+
+async def load_seen(db: AsyncSession, user_id: str) -> SeenFingerprints:
+    seen = await load_seen_fingerprints(db, user_id)
+    # Generation can take seconds; don't hold the connection in a transaction meanwhile.
+    await db.rollback()
+    return seen
+
+async def serve_stored_challenge(
+        db: AsyncSession, difficulty: str, user_id: str, seen: SeenFingerprints
+) -> Optional[dict]:
+    """Degraded mode: reuse another user's stored challenge this user has not seen."""
+    candidates = await get_stored_challenges(
+        db, difficulty, user_id, FALLBACK_CHALLENGE['title'], settings.stored_challenge_candidates
+    )
+    # A dedup retry may call the LLM again; don't hold the connection in a transaction meanwhile.
+    await db.rollback()
+    for candidate in candidates:
+        if not seen.contains_similar(stored_fingerprint(candidate)):
+            logger.warning(f"Serving a stored {difficulty} challenge to user {user_id} while AI generation is unavailable")
+            return candidate
+    return None
+
+async def generate_unseen_challenge(
+        db: AsyncSession, difficulty: str, user_id: str, seen: SeenFingerprints
+) -> dict:
+    """Generate a challenge, retrying when it duplicates one in the user's own history.
+
+    Raises ChallengeGenerationError when neither the LLM nor a stored challenge was
+    available, instead of handing out the hardcoded fallback.
+    """
+    challenge_data = None
+    fallback = lambda: serve_stored_challenge(db, difficulty, user_id, seen)
+    for attempt in range(max(1, settings.challenge_dedup_max_attempts)):
+        challenge_data = await generate_challenge_with_ai(difficulty, fallback=fallback)
+        if challenge_data['title'] == FALLBACK_CHALLENGE['title']:
+            raise ChallengeGenerationError(f"No {difficulty} challenge available for user {user_id}")
+        # Kept on the dict so persist_challenge stores it without hashing again.
+        challenge_data['fingerprint'] = stored_fingerprint(challenge_data)
+        if not seen.contains_similar(challenge_data['fingerprint']):
+            break
+        logger.info("Generated {} challenge already seen by user {}, retrying", difficulty, user_id)
+    return challenge_data
+
+async def persist_challenge(db: AsyncSession, difficulty: str, user_id: str, challenge_data: dict):
+    fingerprint = stored_fingerprint(challenge_data)
+    new_challenge = await create_challenge(
+        db,
+        difficulty,
+        user_id,
+        challenge_data['title'],
+        challenge_data['options'],
+        challenge_data['correct_answer_id'],
+        challenge_data['explanation'],
+        fingerprint,
+    )
+    challenge_index.add(fingerprint)
+    return new_challenge
+
+def format_challenge(challenge) -> ChallengeResponse:
+    return ChallengeResponse(
+        id=challenge.id,
+        difficulty=challenge.difficulty,
+        title=challenge.title,
+        options=challenge.options,
+        correct_answer_id=challenge.correct_answer_id,
+        explanation=challenge.explanation,
+        timestamp=challenge.date_created,
+    )
+
+def encode_history_page(rows, next_cursor: Optional[str]) -> bytes:
+    """Serialize history rows straight to JSON bytes in the HistoryResponse shape.
+
+    Skips building and validating a model per row, which dominates on large pages.
+    """
+    return orjson.dumps({
+        'challenges': [
+            {
+                'id': row.id,
+                'difficulty': row.difficulty,
+                'title': row.title,
+                'options': row.options,
+                'correct_answer_id': row.correct_answer_id,
+                'explanation': row.explanation,
+                'timestamp': row.date_created,
+            }
+            for row in rows
+        ],
+        'next_cursor': next_cursor,
+    })
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def format_question_sse(challenge_data: dict) -> str:
+    """The title and options events for a challenge that is already complete."""
+    return (format_sse('title', {'title': challenge_data['title']})
+            + format_sse('options', {'options': challenge_data['options']}))
+
+@router.post('/generate-challenge', response_model=ChallengeResponse)
 async def generate_challenge(
         request: ChallengeRequest,
         request_obj: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     user_id = None
     try:
         user_details = authenticate_and_get_user_details(request_obj)
-        user_id = user_details.get('user_id')
+        user_id = user_details.user_id
 
-        logger.info(f"User {user_id} requested a {request.difficulty} challenge")
+        logger.info("User {} requested a {} challenge", user_id, request.difficulty)
 
-        quota = get_challenge_quota(db, user_id)
-        if not quota:
-            logger.info(f"Creating new challenge quota for user {user_id}")
-            quota = create_challenge_quota(db, user_id)
+        await reserve_quota(db, user_id)
 
-        quota = reset_quota_if_needed(db, quota)
+        try:
+            seen = await load_seen(db, user_id)
+            challenge_data = None
+            if settings.challenge_pool_enabled:
+                challenge_data = await challenge_pool.pop(db, request.difficulty, seen)
+            if challenge_data is None:
+                challenge_data = await generate_unseen_challenge(db, request.difficulty, user_id, seen)
 
-        if quota.quota_remaining <= 0:
-            logger.warning(f"User {user_id} quota exhausted")
-            raise HTTPException(status_code=429, detail='Quota exhausted')
+            new_challenge = await persist_challenge(db, request.difficulty, user_id, challenge_data)
+        except Exception:
+            await release_quota(db, user_id)
+            raise
 
-        challenge_data = generate_challenge_with_ai(request.difficulty)
+        logger.info("Successfully created challenge {} for user {}", new_challenge.id, user_id)
 
-        challenge_data['options'] = json.dumps(challenge_data['options']) if not isinstance(challenge_data['options'], str) else challenge_data['options']
+        return format_challenge(new_challenge)
 
-        new_challenge = create_challenge(
-            db,
-            request.difficulty,
-            user_id,
-            challenge_data['title'],
-            challenge_data['options'],
-            challenge_data['correct_answer_id'],
-            challenge_data['explanation'],
-        )
+    except HTTPException:
+        raise
+    except ChallengeGenerationError as e:
+        logger.error(f"Challenge generation unavailable for user {user_id}: {e}")
+        raise HTTPException(status_code=503, detail='Challenge generation unavailable, try again shortly')
+    except Exception as e:
+        logger.error(f"Error generating challenge for user {user_id if user_id else 'unknown'}: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
 
-        quota.quota_remaining -=1
-        db.commit()
 
-        logger.info(f"Successfully created challenge {new_challenge.id} for user {user_id}")
+async def stream_challenge_events(difficulty: str, user_id: str, quota_remaining: int) -> AsyncIterator[str]:
+    # The request-scoped session may be closed before the body is streamed, so use our own.
+    async with get_session_factory()() as db:
+        persisted = False
+        try:
+            seen = await load_seen(db, user_id)
+            challenge_data = None
+            if settings.challenge_pool_enabled:
+                challenge_data = await challenge_pool.pop(db, difficulty, seen)
+            if challenge_data is None and openai_breaker.rejecting():
+                challenge_data = await generate_unseen_challenge(db, difficulty, user_id, seen)
 
-        options = new_challenge.options
-        if isinstance(options, str):
-            options = json.loads(options)
+            if challenge_data is None:
+                sent_fields = False
+                try:
+                    async for event, data in stream_challenge_with_ai(difficulty):
+                        if event == 'challenge':
+                            challenge_data = data
+                        else:
+                            sent_fields = True
+                            yield format_sse(event, data)
+                except ChallengeGenerationError as e:
+                    if sent_fields:
+                        raise
+                    # Nothing sent yet, so degrade the same way the non-streaming route does.
+                    logger.warning(f"Streaming generation failed for user {user_id}, falling back: {e}")
+                    challenge_data = await generate_unseen_challenge(db, difficulty, user_id, seen)
+                    yield format_question_sse(challenge_data)
+                else:
+                    challenge_data['fingerprint'] = stored_fingerprint(challenge_data)
+                    if seen.contains_similar(challenge_data['fingerprint']):
+                        # Already in the user's history. Clients render the latest title and
+                        # options events, so sending a replacement supersedes the streamed one.
+                        logger.info("Streamed {} challenge already seen by user {}, replacing it", difficulty, user_id)
+                        challenge_data = await generate_unseen_challenge(db, difficulty, user_id, seen)
+                        yield format_question_sse(challenge_data)
+            else:
+                yield format_question_sse(challenge_data)
 
-        return {
-            'id': new_challenge.id,
-            'difficulty': request.difficulty,
-            'title': new_challenge.title,
-            'options': options,
-            'correct_answer_id': new_challenge.correct_answer_id,
-            'explanation': new_challenge.explanation,
-            'timestamp': new_challenge.date_created.isoformat(),
-        }
+            yield format_sse('explanation', {
+                'correct_answer_id': challenge_data['correct_answer_id'],
+                'explanation': challenge_data['explanation'],
+            })
+
+            new_challenge = await persist_challenge(db, difficulty, user_id, challenge_data)
+            persisted = True
+            logger.info("Successfully streamed challenge {} for user {}", new_challenge.id, user_id)
+        except Exception as e:
+            logger.error(f"Error streaming challenge for user {user_id}: {e}")
+            yield format_sse('error', {'detail': 'Challenge generation failed'})
+        finally:
+            if not persisted:
+                await release_quota(db, user_id)
+
+        if persisted:
+            yield format_sse('done', {
+                'id': new_challenge.id,
+                'difficulty': difficulty,
+                'timestamp': new_challenge.date_created.isoformat(),
+                'quota_remaining': quota_remaining,
+            })
+
+
+@router.post('/generate-challenge/stream')
+async def generate_challenge_stream(
+        request: ChallengeRequest,
+        request_obj: Request,
+        db: AsyncSession = Depends(get_db)
+):
+    user_id = None
+    try:
+        user_details = authenticate_and_get_user_details(request_obj)
+        user_id = user_details.user_id
+
+        logger.info("User {} requested a streamed {} challenge", user_id, request.difficulty)
 
+        quota = await reserve_quota(db, user_id)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error generating challenge for user {user_id if user_id else 'unknown'}: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
+    return StreamingResponse(
+        stream_challenge_events(request.difficulty, user_id, quota.quota_remaining),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
-@router.get('/my-history')
-async def my_history(request: Request, db: Session = Depends(get_db)):
+
+@router.get('/daily-challenge')
+async def get_daily_challenge(
+        request: Request,
+        difficulty: str = Query(pattern='^(easy|medium|hard)$', max_length=10),
+        db: AsyncSession = Depends(get_db)
+):
     user_id = None
     try:
         user_details = authenticate_and_get_user_details(request)
-        user_id = user_details.get('user_id')
-
-        logger.info(f"User {user_id} requested challenge history")
-
-        challenges = get_user_challenges(db, user_id)
-
-        formatted_challenges = []
-        for challenge in challenges:
-            options = challenge.options
-            if isinstance(options, str):
-                options = json.loads(options)
-
-            formatted_challenges.append({
-                'id': challenge.id,
-                'difficulty': challenge.difficulty,
-                'title': challenge.title,
-                'options': options,
-                'correct_answer_id': challenge.correct_answer_id,
-                'explanation': challenge.explanation,
-                'timestamp': challenge.date_created.isoformat(),
-            })
+        user_id = user_details.user_id
 
-        logger.debug(f"Found {len(formatted_challenges)} challenges for user {user_id}")
-        return {'challenges': formatted_challenges}
+        logger.info("User {} requested the {} daily challenge", user_id, difficulty)
+
+        challenge = await daily_challenges.get(difficulty)
+        await daily_challenges.assign(db, user_id, challenge)
+
+        return {
+            'id': challenge['id'],
+            'difficulty': challenge['difficulty'],
+            'date': challenge['challenge_date'].isoformat(),
+            'title': challenge['title'],
+            'options': challenge['options'],
+            'correct_answer_id': challenge['correct_answer_id'],
+            'explanation': challenge['explanation'],
+        }
+    except HTTPException:
+        raise
+    except ChallengeGenerationError as e:
+        logger.error(f"Daily challenge unavailable for user {user_id}: {e}")
+        raise HTTPException(status_code=503, detail='Daily challenge unavailable, try again shortly')
+    except Exception as e:
+        logger.error(f"Error getting daily challenge for user {user_id if user_id else 'unknown'}: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def encode_history_cursor(date_created: datetime, challenge_id: int) -> str:
+    raw = f"{date_created.isoformat()}|{challenge_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_created, challenge_id = raw.split('|')
+        return datetime.fromisoformat(date_created), int(challenge_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+# Clients must revalidate, but a matching ETag lets them skip the body.
+CONDITIONAL_CACHE_HEADERS = {'Cache-Control': 'private, no-cache', 'Vary': 'Authorization'}
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={'ETag': etag, **CONDITIONAL_CACHE_HEADERS})
+
+
+@router.get('/my-history', response_model=HistoryResponse)
+async def my_history(
+        request: Request,
+        limit: Optional[int] = Query(default=None, ge=1),
+        cursor: Optional[str] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    user_id = None
+    try:
+        user_details = authenticate_and_get_user_details(request)
+        user_id = user_details.user_id
+
+        logger.info("User {} requested challenge history", user_id)
+
+        page_size = min(limit or settings.history_default_page_size, settings.history_max_page_size)
+        before = decode_history_cursor(cursor) if cursor else None
+
+        count, max_id = await get_user_history_version(db, user_id)
+        etag = make_etag('history', user_id, count, max_id, page_size, cursor)
+        if etag_matches(request, etag):
+            logger.debug("History for user {} not modified", user_id)
+            return not_modified(etag)
+
+        rows = await get_user_challenges(db, user_id, page_size + 1, before)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = encode_history_cursor(last.date_created, last.id)
+
+        logger.debug("Found {} challenges for user {}", len(rows), user_id)
+        return Response(
+            content=encode_history_page(rows, next_cursor),
+            media_type='application/json',
+            headers={'ETag': etag, **CONDITIONAL_CACHE_HEADERS}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting challenge history for user {user_id if user_id else 'unknown'}: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get('/quota')
-async def get_quota(request: Request, db: Session = Depends(get_db)):
+async def stream_history_export(user_id: str, export_format: str) -> AsyncIterator[str]:
+    # Runs after the request-scoped session is gone, so it opens its own.
+    async with get_session_factory()() as db:
+        result = await stream_user_challenges(db, user_id)
+        async for chunk in export_rows(result, export_format, [column.key for column in EXPORT_COLUMNS]):
+            yield chunk
+    logger.info("Finished {} history export for user {}", export_format, user_id)
+
+@router.get('/my-history/export')
+async def export_history(
+        request: Request,
+        format: str = Query(default='ndjson', pattern='^(ndjson|csv)$')
+):
     user_id = None
     try:
         user_details = authenticate_and_get_user_details(request)
-        user_id = user_details.get('user_id')
+        user_id = user_details.user_id
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting challenge history for user {user_id if user_id else 'unknown'}: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
 
-        logger.info(f"User {user_id} requested quota information")
+    logger.info("User {} requested a {} history export", user_id, format)
 
-        quota = get_challenge_quota(db, user_id)
-        if not quota:
-            logger.debug(f"No quota found for user {user_id}, returning default")
-            return {
-                'user_id': user_id,
-                'quota_remaining': 0,
-                'last_reset_date': datetime.now()
-            }
-        quota = reset_quota_if_needed(db, quota)
-        logger.debug(f"User {user_id} quota: {quota.quota_remaining} remaining")
-        return quota
+    return StreamingResponse(
+        stream_history_export(user_id, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={'Content-Disposition': f'attachment; filename="challenge-history.{format}"'}
+    )
+
+@router.get('/quota', response_model=QuotaResponse)
+async def get_quota(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    user_id = None
+    try:
+        user_details = authenticate_and_get_user_details(request)
+        user_id = user_details.user_id
+
+        logger.info("User {} requested quota information", user_id)
+
+        snapshot = quota_cache.get(user_id)
+        if snapshot is None:
+            quota = await get_challenge_quota(db, user_id)
+            if not quota:
+                logger.debug("No quota found for user {}, returning default", user_id)
+                return QuotaResponse(user_id=user_id, quota_remaining=0, last_reset_date=datetime.now())
+            snapshot = quota_cache.set(user_id, quota.quota_remaining, quota.last_reset_date)
+
+        quota_remaining, last_reset_date = snapshot.effective()
+        etag = make_etag('quota', user_id, quota_remaining, last_reset_date.isoformat() if last_reset_date else None)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers.update({'ETag': etag, **CONDITIONAL_CACHE_HEADERS})
+        logger.debug("User {} quota: {} remaining", user_id, quota_remaining)
+        return QuotaResponse(user_id=user_id, quota_remaining=quota_remaining, last_reset_date=last_reset_date)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting quota information for user {user_id if user_id else 'unknown'}: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,41 +1,65 @@
-from fastapi import APIRouter, Request, HTTPException, Depends
-from sqlalchemy.orm import Session
+from functools import lru_cache
 
-from ..database.db import create_challenge_quota
-from ..database.models import get_db
-from svix.webhooks import Webhook
-import os
+from fastapi import APIRouter, Request, HTTPException
+from svix.webhooks import Webhook, WebhookVerificationError
 import json
+import time
+
+from ..core.config import settings
+from ..logger import get_logger
+from ..metrics import webhook_processing_duration
+from ..services.webhook_batcher import quota_batcher, recent_webhook_messages
 
 router = APIRouter()
+logger = get_logger()
 
-@router.post('/clerk')
-async def handle_user_creation(request: Request, db:Session = Depends(get_db)):
-    webhook_secret = os.getenv('CLERK_WEBHOOK_SECRET')
-    if not webhook_secret:
+
+@lru_cache()
+def get_webhook_verifier() -> Webhook:
+    if not settings.clerk_webhook_secret:
         raise HTTPException(status_code=500, detail="Webhook secret not configured")
+    return Webhook(settings.clerk_webhook_secret)
+
 
+@router.post('/clerk')
+async def handle_user_creation(request: Request):
+    start = time.perf_counter()
+    event_type = 'unknown'
     body = await request.body()
     payload = body.decode('utf-8')
     headers = dict(request.headers)
 
     try:
-        wh = Webhook(webhook_secret)
-        wh.verify(payload, headers)
+        try:
+            get_webhook_verifier().verify(payload, headers)
+        except WebhookVerificationError as e:
+            raise HTTPException(status_code=401, detail=str(e))
+
+        message_id = headers.get('svix-id')
+        if message_id and recent_webhook_messages.seen(message_id):
+            return {'status': 'duplicate', 'message': 'Event already received'}
 
-        data = json.loads(payload)
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid webhook payload")
+        event_type = data.get('type') or 'unknown'
 
-        if data.get('type') == 'user.created':
+        if event_type == 'user.created':
             user_data = data.get('data', {})
             user_id = user_data.get('id')
 
-            if user_id:
-                create_challenge_quota(db, user_id)
-                return {'status': 'success', 'message': 'User quota created'}
-            else:
+            if not user_id:
                 raise HTTPException(status_code=400, detail="User ID not found in webhook data")
 
+            quota_batcher.submit(user_id)
+            if message_id:
+                recent_webhook_messages.add(message_id)
+            return {'status': 'accepted', 'message': 'User quota queued'}
+
+        if message_id:
+            recent_webhook_messages.add(message_id)
         return {'status': 'ignored', 'message': 'Event type not handled'}
 
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=str(e))
\ No newline at end of file
+    finally:
+        webhook_processing_duration.observe(time.perf_counter() - start, event_type=event_type)
@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+class ChallengeResponse(BaseModel):
+    id: int
+    difficulty: str
+    title: str
+    options: Dict[str, str]
+    correct_answer_id: int
+    explanation: str
+    timestamp: datetime
+
+class HistoryResponse(BaseModel):
+    challenges: List[ChallengeResponse]
+    next_cursor: Optional[str] = None
+
+class QuotaResponse(BaseModel):
+    user_id: str
+    quota_remaining: int
+    last_reset_date: Optional[datetime] = None
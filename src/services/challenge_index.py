@@ -0,0 +1,145 @@
+import asyncio
+from collections import defaultdict
+from typing import Dict, Iterator, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..database.db import (
+    get_user_fingerprints,
+    stream_challenge_fingerprints,
+    stream_pooled_challenge_contents,
+    stream_unfingerprinted_challenges
+)
+from ..database.session import get_session_factory
+from ..logger import get_logger
+from .fingerprint import FINGERPRINT_BITS, challenge_fingerprint
+
+logger = get_logger()
+
+
+class SeenFingerprints:
+    """Fingerprints of one user's own challenges, read from the database per request.
+
+    Every worker sees the same history this way, including challenges saved by
+    other processes since this one started.
+    """
+
+    def __init__(self, fingerprints: List[int], max_distance: int):
+        self.max_distance = max_distance
+        self._fingerprints = fingerprints
+
+    def contains_similar(self, fingerprint: int) -> bool:
+        return any((fingerprint ^ other).bit_count() <= self.max_distance for other in self._fingerprints)
+
+
+async def load_seen_fingerprints(db: AsyncSession, user_id: str) -> SeenFingerprints:
+    if not settings.challenge_dedup_enabled:
+        return SeenFingerprints([], settings.challenge_dedup_max_distance)
+    fingerprints, unfingerprinted = await get_user_fingerprints(db, user_id)
+    fingerprints.extend(challenge_fingerprint(challenge) for challenge in unfingerprinted)
+    return SeenFingerprints(fingerprints, settings.challenge_dedup_max_distance)
+
+
+class ChallengeIndex:
+    """In-memory near-duplicate index of challenge fingerprints.
+
+    Used to keep new challenges distinct from everything already stored; whether
+    a particular user has seen a challenge is checked with SeenFingerprints.
+    Fingerprints are split into max_distance + 1 bands. Two fingerprints within
+    max_distance bits of each other must agree on at least one band, so a
+    lookup only compares against the entries sharing a band bucket.
+    """
+
+    def __init__(self, max_distance: int, enabled: bool = True):
+        self.enabled = enabled
+        self.max_distance = max_distance
+        self._num_bands = max_distance + 1
+        self._band_bits = FINGERPRINT_BITS // self._num_bands
+        self._band_mask = (1 << self._band_bits) - 1
+        self._buckets: List[Dict[int, List[int]]] = [defaultdict(list) for _ in range(self._num_bands)]
+        self._fingerprints: List[int] = []
+        self._pooled: Dict[str, Dict[int, int]] = defaultdict(dict)
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def _band_values(self, fingerprint: int) -> Iterator[int]:
+        for band in range(self._num_bands):
+            yield fingerprint >> (band * self._band_bits) & self._band_mask
+
+    def add(self, fingerprint: int):
+        if not self.enabled:
+            return
+        entry = len(self._fingerprints)
+        self._fingerprints.append(fingerprint)
+        for band, value in enumerate(self._band_values(fingerprint)):
+            self._buckets[band][value].append(entry)
+
+    def _similar_entries(self, fingerprint: int) -> Iterator[int]:
+        seen = set()
+        for band, value in enumerate(self._band_values(fingerprint)):
+            for entry in self._buckets[band].get(value, ()):
+                if entry in seen:
+                    continue
+                seen.add(entry)
+                if (self._fingerprints[entry] ^ fingerprint).bit_count() <= self.max_distance:
+                    yield entry
+
+    def contains_similar(self, fingerprint: int) -> bool:
+        if not self.enabled:
+            return False
+        return next(self._similar_entries(fingerprint), None) is not None
+
+    def add_pooled(self, difficulty: str, pool_id: int, fingerprint: int):
+        if not self.enabled:
+            return
+        self._pooled[difficulty][pool_id] = fingerprint
+        self.add(fingerprint)
+
+    def discard_pooled(self, difficulty: str, pool_id: int):
+        self._pooled[difficulty].pop(pool_id, None)
+
+    def pooled_seen_by(self, difficulty: str, seen: SeenFingerprints) -> List[int]:
+        """Ids of pooled challenges too similar to something in the user's history."""
+        if not self.enabled:
+            return []
+        return [
+            pool_id for pool_id, fingerprint in self._pooled[difficulty].items()
+            if seen.contains_similar(fingerprint)
+        ]
+
+    async def rebuild(self):
+        """Load the stored fingerprints of every challenge and pooled challenge.
+
+        Fingerprints are computed once, when a challenge is written; only rows
+        missing one are hashed here.
+        """
+        if not self.enabled:
+            return
+        session_factory = get_session_factory()
+        async with session_factory() as db:
+            result = await stream_challenge_fingerprints(db)
+            async for rows in result.partitions():
+                for row in rows:
+                    self.add(row.fingerprint)
+
+            result = await stream_unfingerprinted_challenges(db)
+            async for rows in result.partitions():
+                fingerprints = await asyncio.to_thread(
+                    lambda: [challenge_fingerprint(row._mapping) for row in rows]
+                )
+                for fingerprint in fingerprints:
+                    self.add(fingerprint)
+
+            result = await stream_pooled_challenge_contents(db)
+            async for rows in result.partitions():
+                for row in rows:
+                    fingerprint = row.fingerprint
+                    if fingerprint is None:
+                        fingerprint = challenge_fingerprint(row._mapping)
+                    self.add_pooled(row.difficulty, row.id, fingerprint)
+        logger.info("Challenge index rebuilt with {} fingerprints", len(self))
+
+
+challenge_index = ChallengeIndex(settings.challenge_dedup_max_distance, settings.challenge_dedup_enabled)
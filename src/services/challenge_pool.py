@@ -0,0 +1,150 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..ai_generator import ChallengeGenerationError, request_challenge_batch
+from ..core.config import settings
+from ..database.db import add_pooled_challenges, count_pooled_challenges, pop_pooled_challenge, try_lock_challenge_pool
+from ..database.session import get_session_factory
+from ..logger import get_logger
+from .challenge_index import SeenFingerprints, challenge_index
+from .fingerprint import challenge_fingerprint
+
+logger = get_logger()
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+
+class ChallengePool:
+    """Keeps ready-made challenges per difficulty in the challenge_pool table.
+
+    Requests pop a stored challenge instead of waiting on the LLM. One worker per
+    difficulty tops the pool back up to challenge_pool_size whenever it drops
+    below challenge_pool_low_water. Across processes, an advisory lock lets only
+    one worker refill a given difficulty at a time.
+    """
+
+    def __init__(self):
+        self._refill_events: Dict[str, asyncio.Event] = {}
+        self._workers: List[asyncio.Task] = []
+        self._generation_limiter: Optional[asyncio.Semaphore] = None
+
+    async def start(self):
+        if self._workers:
+            return
+        self._generation_limiter = asyncio.Semaphore(settings.challenge_pool_refill_concurrency)
+        for difficulty in DIFFICULTIES:
+            event = asyncio.Event()
+            event.set()
+            self._refill_events[difficulty] = event
+            self._workers.append(asyncio.create_task(self._run_worker(difficulty)))
+        logger.info(
+            f"Challenge pool started (size={settings.challenge_pool_size}, "
+            f"low_water={settings.challenge_pool_low_water}, "
+            f"refill_concurrency={settings.challenge_pool_refill_concurrency})"
+        )
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._refill_events = {}
+        logger.info("Challenge pool stopped")
+
+    async def pop(self, db: AsyncSession, difficulty: str, seen: SeenFingerprints) -> Optional[Dict[str, Any]]:
+        """Claim a pooled challenge inside the caller's transaction, or None if the pool is empty.
+
+        Pooled challenges similar to one already in the user's history are skipped.
+        A claimed row stays in the open transaction so the caller's Challenge insert
+        commits both together. On a miss the transaction is rolled back, so the
+        connection isn't left idle in transaction while the caller waits on the LLM.
+        """
+        exclude_ids = challenge_index.pooled_seen_by(difficulty, seen)
+        challenge = await pop_pooled_challenge(db, difficulty, exclude_ids)
+        if challenge is not None:
+            challenge_index.discard_pooled(difficulty, challenge['id'])
+        event = self._refill_events.get(difficulty)
+        if event is not None:
+            event.set()
+        if challenge is None:
+            await db.rollback()
+            logger.warning(f"Challenge pool for {difficulty} is empty")
+        return challenge
+
+    async def _run_worker(self, difficulty: str):
+        event = self._refill_events[difficulty]
+        while True:
+            try:
+                await asyncio.wait_for(event.wait(), timeout=settings.challenge_pool_check_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            event.clear()
+            try:
+                await self._refill(difficulty)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Challenge pool refill for {difficulty} failed: {e}")
+
+    async def _refill(self, difficulty: str):
+        session_factory = get_session_factory()
+        # The lock is held by this session's open transaction until the refill ends;
+        # inserts go through separate sessions so committing them doesn't release it.
+        async with session_factory() as lock_db:
+            if not await try_lock_challenge_pool(lock_db, difficulty):
+                logger.debug("Another worker is refilling the {} challenge pool", difficulty)
+                return
+            available = await count_pooled_challenges(lock_db, difficulty)
+            if available >= settings.challenge_pool_low_water:
+                return
+            await self._fill(difficulty, available)
+
+    async def _fill(self, difficulty: str, available: int):
+        session_factory = get_session_factory()
+
+        missing = settings.challenge_pool_size - available
+        logger.info("Refilling {} challenge pool with {} challenges ({} available)", difficulty, missing, available)
+
+        batch_size = max(1, settings.challenge_pool_batch_size)
+        added = 0
+        for _ in range(max(1, settings.challenge_dedup_max_attempts)):
+            batches = [min(batch_size, missing - start) for start in range(0, missing, batch_size)]
+            results = await asyncio.gather(*(self._generate(difficulty, count) for count in batches))
+            challenges, fingerprints = self._drop_duplicates(difficulty, [c for batch in results for c in batch])
+            if challenges:
+                async with session_factory() as db:
+                    pooled = await add_pooled_challenges(db, difficulty, challenges, fingerprints)
+                for entry, fingerprint in zip(pooled, fingerprints):
+                    challenge_index.add_pooled(difficulty, entry.id, fingerprint)
+                added += len(challenges)
+                missing -= len(challenges)
+            if missing <= 0:
+                break
+        logger.info("Added {} challenges to the {} pool", added, difficulty)
+
+    def _drop_duplicates(self, difficulty: str, challenges: List[Dict[str, Any]]):
+        """Reject challenges too similar to any stored, pooled or earlier accepted challenge."""
+        accepted, fingerprints = [], []
+        for challenge in challenges:
+            fingerprint = challenge_fingerprint(challenge)
+            if challenge_index.contains_similar(fingerprint) or any(
+                    (fingerprint ^ other).bit_count() <= challenge_index.max_distance for other in fingerprints):
+                logger.debug("Rejecting near-duplicate {} challenge: {}", difficulty, challenge['title'])
+                continue
+            accepted.append(challenge)
+            fingerprints.append(fingerprint)
+        return accepted, fingerprints
+
+    async def _generate(self, difficulty: str, count: int) -> List[Dict[str, Any]]:
+        async with self._generation_limiter:
+            try:
+                challenges = await request_challenge_batch(difficulty, count)
+            except ChallengeGenerationError as e:
+                logger.warning(f"Discarding failed {difficulty} pool generation: {e}")
+                return []
+        return challenges
+
+
+challenge_pool = ChallengePool()
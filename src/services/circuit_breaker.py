@@ -0,0 +1,160 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from ..logger import get_logger
+
+logger = get_logger()
+
+T = TypeVar('T')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit is open."""
+
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures or latency-SLO breaches.
+
+    Closed: calls pass through; `failure_threshold` consecutive failures (errors
+    or calls slower than `latency_slo_seconds`) open the circuit.
+    Open: calls raise CircuitOpenError for `open_seconds`.
+    Half-open: one probe call is let through; success closes the circuit,
+    failure opens it again. A probe that never reports back is given up on
+    after `probe_timeout_seconds`, so another caller can probe.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int,
+            latency_slo_seconds: float,
+            open_seconds: float,
+            probe_timeout_seconds: float
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.latency_slo_seconds = latency_slo_seconds
+        self.open_seconds = open_seconds
+        self.probe_timeout_seconds = probe_timeout_seconds
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started_at = 0.0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def _probing(self) -> bool:
+        return self._probe_in_flight and time.monotonic() - self._probe_started_at < self.probe_timeout_seconds
+
+    def rejecting(self) -> bool:
+        """Whether before_call() would currently raise, without reserving anything."""
+        state = self.state
+        return state == OPEN or (state == HALF_OPEN and self._probing())
+
+    def before_call(self):
+        """Reserve permission to call upstream, or raise CircuitOpenError.
+
+        A caller that gets permission must end with record_success, record_failure or release.
+        """
+        state = self.state
+        if state == OPEN:
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        if state == HALF_OPEN:
+            if self._probing():
+                raise CircuitOpenError(f"{self.name} circuit is half-open and probing")
+            self._probe_in_flight = True
+            self._probe_started_at = time.monotonic()
+
+    def release(self):
+        """Give up a reservation without an outcome, e.g. when the call was cancelled."""
+        self._probe_in_flight = False
+
+    def record_success(self, elapsed_seconds: float):
+        if elapsed_seconds > self.latency_slo_seconds:
+            logger.warning(f"{self.name} call took {elapsed_seconds:.1f}s, above the {self.latency_slo_seconds}s SLO")
+            self.record_failure()
+            return
+        if self._state != CLOSED:
+            logger.info("{} circuit closed", self.name)
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._consecutive_failures += 1
+        self._probe_in_flight = False
+        if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self._state != OPEN:
+                logger.warning(f"{self.name} circuit opened after {self._consecutive_failures} consecutive failures")
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    async def call(self, call: Callable[[], Awaitable[T]]) -> T:
+        self.before_call()
+        start = time.monotonic()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success(time.monotonic() - start)
+        return result
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if len(self._samples) < 20:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+
+async def hedged(call: Callable[[], Awaitable[T]], delay: float) -> T:
+    """Run `call`; if it has not finished after `delay` seconds, start a second one.
+
+    The first successful result wins and the other attempt is cancelled. If both
+    fail, the first attempt's error is raised.
+    """
+    first = asyncio.ensure_future(call())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return first.result()
+
+        tasks.append(asyncio.ensure_future(call()))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+        return first.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
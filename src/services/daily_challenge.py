@@ -0,0 +1,79 @@
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Set, Tuple
+
+from ..ai_generator import FALLBACK_CHALLENGE, ChallengeGenerationError, generate_challenge_with_ai
+from ..database.db import assign_daily_challenge, create_daily_challenge, get_daily_challenge, lock_daily_challenge
+from ..database.session import get_session_factory
+from ..logger import get_logger
+from .single_flight import SingleFlight
+
+logger = get_logger()
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+class DailyChallengeService:
+    """Serves one shared challenge per difficulty per UTC day.
+
+    Lookups hit an in-memory cache keyed by (date, difficulty). On a miss,
+    concurrent requests in this process share one load via single-flight, and a
+    Postgres advisory lock makes sure only one worker across processes
+    generates the day's challenge; the others read the row it stored.
+    Assignments already recorded by this process are remembered for the day, so
+    repeat requests don't write to the database.
+    """
+
+    def __init__(self):
+        self._cache: Dict[Tuple[date, str], Dict[str, Any]] = {}
+        self._assigned: Dict[date, Set[Tuple[str, int]]] = {}
+        self._loads = SingleFlight()
+
+    async def get(self, difficulty: str) -> Dict[str, Any]:
+        key = (utc_today(), difficulty)
+        challenge = self._cache.get(key)
+        if challenge is None:
+            challenge = await self._loads.do(key, lambda: self._load(*key))
+        return challenge
+
+    async def assign(self, db, user_id: str, challenge: Dict[str, Any]):
+        assigned = self._assigned.setdefault(challenge['challenge_date'], set())
+        pair = (user_id, challenge['id'])
+        if pair in assigned:
+            return
+        await assign_daily_challenge(db, user_id, challenge['id'])
+        assigned.add(pair)
+
+    async def _load(self, challenge_date: date, difficulty: str) -> Dict[str, Any]:
+        async with get_session_factory()() as db:
+            challenge = await get_daily_challenge(db, challenge_date, difficulty)
+            if challenge is None:
+                await lock_daily_challenge(db, challenge_date, difficulty)
+                challenge = await get_daily_challenge(db, challenge_date, difficulty)
+            if challenge is None:
+                challenge = await self._generate(db, challenge_date, difficulty)
+            else:
+                await db.rollback()
+
+        self._evict_before(challenge_date)
+        self._cache[(challenge_date, difficulty)] = challenge
+        return challenge
+
+    async def _generate(self, db, challenge_date: date, difficulty: str) -> Dict[str, Any]:
+        logger.info("Generating the {} daily challenge for {}", difficulty, challenge_date)
+        challenge_data = await generate_challenge_with_ai(difficulty)
+        if challenge_data['title'] == FALLBACK_CHALLENGE['title']:
+            # Don't pin the placeholder as the day's challenge; the next request tries again.
+            await db.rollback()
+            raise ChallengeGenerationError(f"Could not generate the {difficulty} daily challenge for {challenge_date}")
+        return await create_daily_challenge(db, challenge_date, difficulty, challenge_data)
+
+    def _evict_before(self, challenge_date: date):
+        for key in [key for key in self._cache if key[0] < challenge_date]:
+            del self._cache[key]
+        for day in [day for day in self._assigned if day < challenge_date]:
+            del self._assigned[day]
+
+
+daily_challenges = DailyChallengeService()
@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Sequence
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _row_dict(row) -> dict:
+    record = dict(row._mapping)
+    for key, value in record.items():
+        if isinstance(value, datetime):
+            record[key] = value.isoformat()
+    return record
+
+
+def _ndjson_chunk(rows: Sequence) -> str:
+    return ''.join(json.dumps(_row_dict(row), ensure_ascii=False) + '\n' for row in rows)
+
+
+def _csv_chunk(rows: Sequence, writer, buffer: io.StringIO) -> str:
+    for row in rows:
+        record = _row_dict(row)
+        record['options'] = json.dumps(record['options'], ensure_ascii=False)
+        writer.writerow(record.values())
+    chunk = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return chunk
+
+
+async def export_rows(result, export_format: str, columns: Sequence[str]) -> AsyncIterator[str]:
+    """Encode a streamed query result as NDJSON or CSV, one chunk per fetched partition.
+
+    Only one partition of rows is held in memory at a time, however many rows the
+    result has.
+    """
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        async for rows in result.partitions():
+            yield _csv_chunk(rows, writer, buffer)
+        yield buffer.getvalue()
+    else:
+        async for rows in result.partitions():
+            yield _ndjson_chunk(rows)
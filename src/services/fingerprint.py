@@ -0,0 +1,30 @@
+import hashlib
+import re
+from typing import Any, Dict, List
+
+FINGERPRINT_BITS = 64
+_NON_WORD = re.compile(r'[^a-z0-9_]+')
+
+
+def normalize_challenge_text(title: str, options: Dict[str, str]) -> List[str]:
+    """Lowercased word tokens of the title followed by the options in key order."""
+    text = ' '.join([title, *(str(options[key]) for key in sorted(options))])
+    return _NON_WORD.sub(' ', text.lower()).split()
+
+
+def challenge_fingerprint(challenge: Dict[str, Any]) -> int:
+    """64-bit SimHash over word unigrams and bigrams of a challenge's title and options."""
+    tokens = normalize_challenge_text(challenge['title'], challenge['options'])
+    features = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+
+    weights = [0] * FINGERPRINT_BITS
+    for feature in features:
+        digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'big')
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if digest >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
@@ -0,0 +1,59 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from ..core.config import settings
+
+
+class QuotaSnapshot:
+    """Stored quota state for one user, as last read from or written to the database."""
+
+    __slots__ = ('quota_remaining', 'last_reset_date')
+
+    def __init__(self, quota_remaining: int, last_reset_date: Optional[datetime]):
+        self.quota_remaining = quota_remaining
+        self.last_reset_date = last_reset_date
+
+    def effective(self, now: Optional[datetime] = None) -> Tuple[int, Optional[datetime]]:
+        """Quota as the user should see it, applying the 24h reset without persisting it.
+
+        The reset itself is only written by consume_challenge_quota, on the next decrement.
+        """
+        now = now or datetime.now()
+        if self.last_reset_date is None or now - self.last_reset_date > timedelta(hours=24):
+            return settings.daily_challenge_quota, self.last_reset_date
+        return self.quota_remaining, self.last_reset_date
+
+
+class QuotaCache:
+    """Short-TTL per-user quota cache, kept current by write-through from quota writers."""
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: OrderedDict[str, Tuple[QuotaSnapshot, float]] = OrderedDict()
+
+    def get(self, user_id: str) -> Optional[QuotaSnapshot]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        snapshot, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        return snapshot
+
+    def set(self, user_id: str, quota_remaining: int, last_reset_date: Optional[datetime]) -> QuotaSnapshot:
+        snapshot = QuotaSnapshot(quota_remaining, last_reset_date)
+        self._entries[user_id] = (snapshot, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+
+quota_cache = QuotaCache(settings.quota_cache_ttl_seconds, settings.quota_cache_max_size)
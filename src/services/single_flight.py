@@ -0,0 +1,86 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, List, Set, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one in-flight call.
+
+    Callers arriving while a call for their key is running await its result
+    instead of starting another one. Results are not cached once the call ends.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(call())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._forget(key, future))
+        # Shielded so one cancelled waiter doesn't cancel the call for everyone else.
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: Any):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if not future.cancelled():
+            # Mark the exception retrieved when every waiter has gone away.
+            future.exception()
+
+
+class RequestCoalescer(Generic[T]):
+    """Groups concurrent requests for the same key into one batched upstream call.
+
+    The first request for a key opens a batch and waits up to `window_seconds`
+    for others to join, closing early at `max_batch` waiters. The batch then
+    asks `fetch(key, n)` for one result per waiter and hands them out in order;
+    if fewer results come back than there are waiters, they are reused
+    round-robin. A failed fetch fails every waiter in the batch.
+    """
+
+    def __init__(
+            self,
+            fetch: Callable[[Hashable, int], Awaitable[List[T]]],
+            window_seconds: float,
+            max_batch: int
+    ):
+        self._fetch = fetch
+        self.window_seconds = window_seconds
+        self.max_batch = max(1, max_batch)
+        self._open: Dict[Hashable, List[asyncio.Future]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def request(self, key: Hashable) -> T:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiters = self._open.get(key)
+        if waiters is None:
+            waiters = self._open[key] = []
+            loop.call_later(self.window_seconds, self._close, key, waiters)
+        waiters.append(future)
+        if len(waiters) >= self.max_batch:
+            self._close(key, waiters)
+        return await future
+
+    def _close(self, key: Hashable, waiters: List[asyncio.Future]):
+        if self._open.get(key) is not waiters:
+            return
+        del self._open[key]
+        task = asyncio.ensure_future(self._run(key, waiters))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Hashable, waiters: List[asyncio.Future]):
+        try:
+            results = await self._fetch(key, len(waiters))
+        except Exception as e:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+        for i, waiter in enumerate(waiters):
+            if not waiter.done():
+                waiter.set_result(results[i % len(results)])
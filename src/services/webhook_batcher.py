@@ -0,0 +1,110 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from ..core.config import settings
+from ..database.db import create_challenge_quotas
+from ..database.session import get_session_factory
+from ..logger import get_logger
+from .quota_cache import quota_cache
+
+logger = get_logger()
+
+# Queued by stop(); the worker flushes whatever it has collected and exits.
+_STOP = object()
+
+
+class RecentMessageIds:
+    """Bounded, time-limited window of webhook message ids already accepted."""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._seen: OrderedDict[str, float] = OrderedDict()
+
+    def seen(self, message_id: str) -> bool:
+        expires_at = self._seen.get(message_id)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self._seen[message_id]
+            return False
+        return True
+
+    def add(self, message_id: str):
+        self._seen[message_id] = time.monotonic() + self.ttl_seconds
+        self._seen.move_to_end(message_id)
+        while len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+
+
+class QuotaBatcher:
+    """Collects user ids from webhooks and creates their quotas in bulk upserts.
+
+    A batch is flushed when it reaches webhook_batch_size or after
+    webhook_flush_interval_ms, whichever comes first. Pending ids are flushed
+    on shutdown. Ids accepted but not yet flushed are lost if the process
+    crashes; consume_challenge_quota still creates the quota on first use.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        # Not cancel(): ids already pulled into a batch would be dropped.
+        self._queue.put_nowait(_STOP)
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+
+    def submit(self, user_id: str):
+        if self._queue is None:
+            raise RuntimeError("Quota batcher is not running")
+        self._queue.put_nowait(user_id)
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + settings.webhook_flush_interval_ms / 1000
+            while len(batch) < settings.webhook_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, user_ids: List[str]):
+        unique_ids = list(dict.fromkeys(user_ids))
+        try:
+            async with get_session_factory()() as db:
+                created = await create_challenge_quotas(db, unique_ids)
+        except Exception as e:
+            logger.error(f"Failed to create quotas for {len(unique_ids)} webhook users: {e}")
+            return
+        for row in created:
+            quota_cache.set(row.user_id, row.quota_remaining, row.last_reset_date)
+        logger.info("Created {} quotas from a batch of {} webhook users", len(created), len(unique_ids))
+
+
+quota_batcher = QuotaBatcher()
+recent_webhook_messages = RecentMessageIds(settings.webhook_dedup_window_size, settings.webhook_dedup_ttl_seconds)
@@ -0,0 +1,73 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src import ai_generator
+from src.services.circuit_breaker import HALF_OPEN, CircuitBreaker, CircuitOpenError
+
+
+def half_open_breaker(probe_timeout_seconds: float = 60) -> CircuitBreaker:
+    breaker = CircuitBreaker(
+        'test', failure_threshold=1, latency_slo_seconds=10, open_seconds=0,
+        probe_timeout_seconds=probe_timeout_seconds,
+    )
+    breaker.record_failure()
+    assert breaker.state == HALF_OPEN
+    return breaker
+
+
+def test_half_open_allows_a_single_probe():
+    breaker = half_open_breaker()
+
+    breaker.before_call()
+
+    assert breaker.rejecting()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_lost_probe_times_out():
+    breaker = half_open_breaker(probe_timeout_seconds=0)
+
+    breaker.before_call()
+
+    assert not breaker.rejecting()
+    breaker.before_call()
+
+
+class FakeStream:
+    def __init__(self, text: str):
+        self._events = [SimpleNamespace(type='response.output_text.delta', delta=char) for char in text]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for event in self._events:
+            yield event
+
+    async def close(self):
+        pass
+
+
+def test_closing_the_stream_mid_probe_releases_it(monkeypatch):
+    breaker = half_open_breaker()
+    question = {'title': 'Q', 'options': {key: key for key in 'ABCD'}, 'correct_answer_id': 0, 'explanation': 'E'}
+
+    async def create(**kwargs):
+        return FakeStream(json.dumps({'questions': [question]}))
+
+    client = SimpleNamespace(responses=SimpleNamespace(create=create))
+    monkeypatch.setattr(ai_generator, 'openai_breaker', breaker)
+    monkeypatch.setattr(ai_generator, 'get_openai_client', lambda: client)
+
+    async def disconnect_after_title():
+        events = ai_generator.stream_challenge_with_ai('easy')
+        assert (await anext(events))[0] == 'title'
+        await events.aclose()
+
+    asyncio.run(disconnect_after_title())
+
+    assert not breaker.rejecting()
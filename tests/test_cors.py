@@ -0,0 +1,26 @@
+from fastapi.testclient import TestClient
+
+from src.app import app
+
+ORIGIN = 'http://localhost:3000'
+
+
+def test_preflight_allows_if_none_match():
+    client = TestClient(app)
+
+    response = client.options('/api/my-history', headers={
+        'Origin': ORIGIN,
+        'Access-Control-Request-Method': 'GET',
+        'Access-Control-Request-Headers': 'authorization,if-none-match',
+    })
+
+    assert response.status_code == 200
+    assert 'if-none-match' in response.headers['access-control-allow-headers'].lower()
+
+
+def test_etag_is_exposed_to_cross_origin_clients():
+    client = TestClient(app)
+
+    response = client.get('/health/startup', headers={'Origin': ORIGIN})
+
+    assert 'etag' in response.headers['access-control-expose-headers'].lower()
@@ -0,0 +1,120 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.ai_generator import FALLBACK_CHALLENGE, ChallengeGenerationError
+from src.app import app
+from src.database.session import get_db
+from src.routes import challenge as challenge_routes
+from src.services.challenge_index import SeenFingerprints
+from src.services.fingerprint import challenge_fingerprint
+from src.schemas.auth import UserData
+
+
+class FakeSession:
+    async def rollback(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+async def fake_db():
+    yield FakeSession()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    calls = {'refunded': [], 'created': [], 'history': []}
+
+    async def consume(db, user_id):
+        return SimpleNamespace(quota_remaining=2, last_reset_date=datetime.now())
+
+    async def refund(db, user_id):
+        calls['refunded'].append(user_id)
+
+    async def create(db, difficulty, created_by, title, *args):
+        calls['created'].append(title)
+        return SimpleNamespace(id=1, date_created=datetime.now())
+
+    monkeypatch.setattr(challenge_routes, 'authenticate_and_get_user_details', lambda request: UserData(user_id='user_1'))
+    monkeypatch.setattr(challenge_routes, 'consume_challenge_quota', consume)
+    monkeypatch.setattr(challenge_routes, 'refund_challenge_quota', refund)
+    async def load_seen(db, user_id):
+        return SeenFingerprints([challenge_fingerprint(c) for c in calls['history']], 3)
+
+    monkeypatch.setattr(challenge_routes, 'create_challenge', create)
+    monkeypatch.setattr(challenge_routes, 'load_seen_fingerprints', load_seen)
+    monkeypatch.setattr(challenge_routes, 'get_session_factory', lambda: FakeSession)
+    monkeypatch.setattr(challenge_routes.settings, 'challenge_pool_enabled', False)
+    app.dependency_overrides[get_db] = fake_db
+    yield TestClient(app), calls, monkeypatch
+    app.dependency_overrides.clear()
+
+
+def test_failed_generation_is_refunded_and_not_saved(client):
+    client, calls, monkeypatch = client
+
+    async def generate(difficulty, fallback=None):
+        return dict(FALLBACK_CHALLENGE)
+
+    monkeypatch.setattr(challenge_routes, 'generate_challenge_with_ai', generate)
+
+    response = client.post('/api/generate-challenge', json={'difficulty': 'easy'})
+
+    assert response.status_code == 503
+    assert calls['refunded'] == ['user_1']
+    assert calls['created'] == []
+
+
+def test_stream_failure_before_any_field_falls_back(client):
+    client, calls, monkeypatch = client
+    stored = {'title': 'Stored question', 'options': {key: key for key in 'ABCD'},
+              'correct_answer_id': 1, 'explanation': 'Because'}
+
+    async def failing_stream(difficulty):
+        raise ChallengeGenerationError('upstream down')
+        yield
+
+    async def generate(difficulty, fallback=None):
+        return dict(stored)
+
+    monkeypatch.setattr(challenge_routes, 'stream_challenge_with_ai', failing_stream)
+    monkeypatch.setattr(challenge_routes, 'generate_challenge_with_ai', generate)
+
+    response = client.post('/api/generate-challenge/stream', json={'difficulty': 'easy'})
+
+    events = [line.split(': ', 1)[1] for line in response.text.splitlines() if line.startswith('event: ')]
+    assert events == ['title', 'options', 'explanation', 'done']
+    assert calls['created'] == ['Stored question']
+    assert calls['refunded'] == []
+
+
+def test_streamed_challenge_already_seen_is_replaced(client):
+    client, calls, monkeypatch = client
+    seen = {'title': 'Seen question', 'options': {key: key for key in 'ABCD'},
+            'correct_answer_id': 1, 'explanation': 'Because'}
+    fresh = dict(seen, title='Fresh question', options={key: key * 2 for key in 'WXYZ'})
+    calls['history'].append(seen)
+
+    async def stream(difficulty):
+        yield 'title', {'title': seen['title']}
+        yield 'options', {'options': seen['options']}
+        yield 'challenge', dict(seen)
+
+    async def generate(difficulty, fallback=None):
+        return dict(fresh)
+
+    monkeypatch.setattr(challenge_routes, 'stream_challenge_with_ai', stream)
+    monkeypatch.setattr(challenge_routes, 'generate_challenge_with_ai', generate)
+
+    response = client.post('/api/generate-challenge/stream', json={'difficulty': 'easy'})
+
+    events = [line.split(': ', 1)[1] for line in response.text.splitlines() if line.startswith('event: ')]
+    assert events == ['title', 'options', 'title', 'options', 'explanation', 'done']
+    assert calls['created'] == ['Fresh question']
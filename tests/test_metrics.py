@@ -0,0 +1,45 @@
+import asyncio
+
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from src.app import app
+from src.database.session import init_engine
+
+
+def test_metrics_scrape_succeeds():
+    # Creating the engine doesn't connect, but it gives the pool gauge something to read.
+    init_engine()
+    client = TestClient(app)
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert 'db_pool_connections{state="checked_out"} 0' in response.text
+    assert 'http_request_duration_seconds' in response.text
+
+
+
+def test_request_duration_covers_streamed_body():
+    async def slow_body():
+        yield 'first\n'
+        await asyncio.sleep(0.2)
+        yield 'second\n'
+
+    async def stream():
+        return StreamingResponse(slow_body(), media_type='text/plain')
+
+    app.add_api_route('/test-stream', stream)
+    try:
+        client = TestClient(app)
+        assert client.get('/test-stream').text == 'first\nsecond\n'
+        metrics = client.get('/metrics').text
+    finally:
+        app.router.routes.pop()
+
+    labels = 'method="GET",route="/test-stream",status="200"'
+    duration = next(
+        line for line in metrics.splitlines()
+        if line.startswith(f'http_request_duration_seconds_sum{{{labels}}}')
+    )
+    assert float(duration.split()[-1]) >= 0.2